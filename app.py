@@ -6,6 +6,7 @@
 """
 
 import os
+import re
 import pandas as pd
 import numpy as np
 from flask import Flask, render_template, request, jsonify, send_file
@@ -14,6 +15,17 @@ import logging
 from datetime import datetime
 import zipfile
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+# Rust 实现的 xlsx/xls 解析引擎，比 openpyxl 快数倍；pandas 2.2 起才支持 engine='calamine'
+# 不可用时为 None，由 pandas 按扩展名选择（openpyxl/xlrd）
+_PANDAS_VERSION = tuple(int(part) for part in re.findall(r'\d+', pd.__version__)[:2])
+EXCEL_ENGINE = 'calamine' if python_calamine is not None and _PANDAS_VERSION >= (2, 2) else None
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -23,11 +35,24 @@ app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB限制
 
 # 目录配置
-UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'output'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
+# 文件名中的周次，如 "2024年第40周.xlsx"
+_WEEK_RE = re.compile(r'第(\d+)周')
+
+
+def _extract_week(name, default=40):
+    """从文件名提取周次，未找到时返回默认周次"""
+    week_match = _WEEK_RE.search(name) if name else None
+    return int(week_match.group(1)) if week_match else default
+
+
+# 字段转换每批处理的行数，限制中间结果的内存占用
+PROCESS_CHUNK_ROWS = 50_000
+# 按年度并行写CSV的线程数，年度数通常只有2~5个
+CSV_WRITE_WORKERS = 4
+
 class DataProcessor:
     """数据处理器 - 简化版"""
     
@@ -138,13 +163,18 @@ class DataProcessor:
             True: True, False: False
         }
 
-    def standardize_fields(self, df, original_filename=None):
-        """标准化字段名和数据类型"""
-        # 首先重命名中文列名为英文列名
-        df_renamed = df.rename(columns=self.field_mapping)
-        
-        # 创建结果DataFrame，保留所有重命名后的字段
-        result_df = df_renamed.copy()
+        # 读取Excel时保留的列：映射表中的中英文列名、输出字段和保费计划系数
+        self.used_columns = frozenset(self.field_mapping).union(
+            self.field_mapping.values(), self.required_fields, ('premium_plan_coefficient',))
+
+    def is_used_column(self, column):
+        """读取Excel时只解析会被使用的列"""
+        return column in self.used_columns
+
+    def standardize_fields(self, df, original_filename=None, week_number=None):
+        """标准化字段名和数据类型，week_number 未传入时从原始文件名提取"""
+        # 重命名中文列名为英文列名，rename 已返回新的DataFrame，无需再复制
+        result_df = df.rename(columns=self.field_mapping)
         
         # 处理筛选维度字段的默认值
         for field in self.filtering_fields:
@@ -160,164 +190,193 @@ class DataProcessor:
         # 处理布尔字段
         for bool_field in ['is_new_energy_vehicle', 'is_transferred_vehicle']:
             if bool_field in result_df.columns:
-                result_df[bool_field] = result_df[bool_field].apply(lambda x: self.boolean_map.get(x, False))
+                if result_df[bool_field].dtype == bool:
+                    continue
+                # Series.map 按字典批量查找，未匹配的值（含空值）视为 False
+                result_df[bool_field] = result_df[bool_field].map(self.boolean_map).eq(True)
         
         # 处理年份字段 - 从保险起期字段提取年份
         if 'policy_start_year' in result_df.columns:
             # 如果保险起期是日期格式，提取年份；如果已经是年份，直接使用
-            def extract_year(value):
-                if pd.isna(value):
-                    return 0
-                try:
-                    # 尝试转换为日期时间格式
-                    if isinstance(value, str):
-                        # 处理各种日期格式
-                        if '/' in value or '-' in value or '年' in value:
-                            # 尝试解析日期
-                            date_obj = pd.to_datetime(value, errors='coerce')
-                            if pd.notna(date_obj):
-                                return date_obj.year
-                        # 如果是纯数字字符串，直接转换
-                        return int(float(value))
-                    elif isinstance(value, (int, float)):
-                        # 如果是数值，判断是年份还是日期序列号
-                        if value > 1900 and value < 2100:
-                            return int(value)
-                        else:
-                            # 可能是Excel日期序列号，尝试转换
-                            date_obj = pd.to_datetime(value, origin='1900-01-01', unit='D', errors='coerce')
-                            if pd.notna(date_obj):
-                                return date_obj.year
-                    else:
-                        # 其他类型，尝试转换为日期
-                        date_obj = pd.to_datetime(value, errors='coerce')
-                        if pd.notna(date_obj):
-                            return date_obj.year
-                    return 0
-                except:
-                    return 0
-            
-            result_df['policy_start_year'] = result_df['policy_start_year'].apply(extract_year)
+            result_df['policy_start_year'] = self.extract_policy_years(result_df['policy_start_year'])
         else:
             result_df['policy_start_year'] = 0
         
         # 从文件名提取周次
-        week_number = 40  # 默认值
-        if original_filename:
-            import re
-            week_match = re.search(r'第(\d+)周', original_filename)
-            if week_match:
-                week_number = int(week_match.group(1))
-        
+        if week_number is None:
+            week_number = _extract_week(original_filename)
         result_df['week_number'] = week_number
         
         return result_df
 
+    def extract_policy_years(self, values):
+        """
+        按列向量化提取保险起期年份，规则与逐行解析一致：
+        日期取年份；1900~2100 之间的数值视为年份；其他数值按Excel日期序列号解析；
+        含日期分隔符的字符串按日期解析，失败时按数字截断；无法识别的值为0
+        """
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values.dt.year.fillna(0).astype('int64')
+
+        years = np.zeros(len(values), dtype='int64')
+        if pd.api.types.is_numeric_dtype(values):
+            years[:] = self._numeric_years(values.to_numpy(dtype='float64', na_value=np.nan))
+            return pd.Series(years, index=values.index)
+        if pd.api.types.is_string_dtype(values) and not pd.api.types.is_object_dtype(values):
+            # 字符串类型的列只可能是字符串或空值，无需逐值判断类型
+            present = values.notna().to_numpy()
+            if present.any():
+                years[present] = self._string_years(values[present])
+            return pd.Series(years, index=values.index)
+
+        kinds = values.map(type).to_numpy()
+        missing = values.isna().to_numpy()
+        is_str = (kinds == str) & ~missing
+        is_num = np.isin(kinds, [int, float, bool, np.float64]) & ~missing
+        is_other = ~(is_str | is_num | missing)
+        objects = values.to_numpy(dtype=object)
+
+        if is_num.any():
+            years[is_num] = self._numeric_years(objects[is_num].astype('float64'))
+        if is_str.any():
+            years[is_str] = self._string_years(pd.Series(objects[is_str], dtype=object))
+        if is_other.any():
+            dates = pd.to_datetime(pd.Series(objects[is_other], dtype=object), errors='coerce', format='mixed')
+            years[is_other] = dates.dt.year.fillna(0).astype('int64').to_numpy()
+        return pd.Series(years, index=values.index)
+
+    @staticmethod
+    def _numeric_years(numbers):
+        """数值数组转年份：1900~2100 之间直接截断为年份，其余按Excel日期序列号（1900-01-01起）换算"""
+        years = np.zeros(len(numbers), dtype='int64')
+        in_range = (numbers > 1900) & (numbers < 2100)
+        years[in_range] = numbers[in_range].astype('int64')
+        serial = ~in_range & np.isfinite(numbers)
+        if serial.any():
+            dates = pd.to_datetime(pd.Series(numbers[serial]), origin='1900-01-01', unit='D', errors='coerce')
+            years[serial] = dates.dt.year.fillna(0).astype('int64').to_numpy()
+        return years
+
+    @staticmethod
+    def _string_years(strings):
+        """字符串转年份：含日期分隔符的先按日期解析，其余及解析失败的按数字截断"""
+        years = np.zeros(len(strings), dtype='int64')
+        pending = np.ones(len(strings), dtype=bool)
+        has_sep = strings.str.contains(r'[/\-年]', regex=True).to_numpy(dtype=bool)
+        if has_sep.any():
+            dates = pd.to_datetime(strings[has_sep], errors='coerce', format='mixed')
+            parsed = dates.notna().to_numpy()
+            positions = np.flatnonzero(has_sep)[parsed]
+            years[positions] = dates.dt.year.to_numpy()[parsed]
+            pending[positions] = False
+        numbers = pd.to_numeric(strings[pending], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        finite = np.isfinite(numbers)
+        truncated = np.zeros(len(numbers), dtype='int64')
+        truncated[finite] = numbers[finite].astype('int64')
+        years[pending] = truncated
+        return years
+
     def calculate_absolute_fields(self, df):
-        """计算9个绝对值字段"""
-        # 复制DataFrame以避免修改原数据
-        result_df = df.copy()
-        
+        """计算9个绝对值字段，直接写入传入的DataFrame（由 standardize_fields 生成）"""
+        result_df = df
+        row_count = len(df)
+
+        def numeric(column, fill):
+            """输入列转为 float64 数组，缺失或无法解析的值用 fill 填充；列不存在时返回 None"""
+            if column not in df.columns:
+                return None
+            values = df[column]
+            # 读取时已是数值类型的列直接使用，只有文本/混合列才需要逐值解析
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values, errors='coerce')
+            return values.to_numpy(dtype='float64', na_value=fill)
+
+        # 所有计算直接在 NumPy 数组上完成，避免生成中间 Series
+        signed_wan = numeric('signed_premium_wan', 0.0)
+        matured_wan = numeric('matured_premium_wan', 0.0)
+        coeff = numeric('commercial_autonomous_coefficient', 1.0)
+        avg_premium = numeric('average_premium', 1.0)
+        claim_count = numeric('claim_case_count', 0.0)
+        total_claim_wan = numeric('total_claim_wan', 0.0)
+        expense_ratio = numeric('expense_ratio', 0.0)
+        plan_coeff = numeric('premium_plan_coefficient', 1.0)
+        variable_cost_ratio = numeric('variable_cost_ratio', 0.0)
+
         # 1. 签单保费(元) = 跟单保费(万) * 10000
-        if 'signed_premium_wan' in df.columns:
-            signed_premium_series = pd.to_numeric(df['signed_premium_wan'], errors='coerce').fillna(0)
-            result_df['signed_premium_yuan'] = signed_premium_series.astype(float) * 10000
-        else:
-            result_df['signed_premium_yuan'] = 0.0
-        
+        signed_yuan = signed_wan * 10000 if signed_wan is not None else np.zeros(row_count)
+
         # 2. 满期保费(元) = 满期净保费(万) * 10000
-        if 'matured_premium_wan' in df.columns:
-            matured_premium_series = pd.to_numeric(df['matured_premium_wan'], errors='coerce').fillna(0)
-            result_df['matured_premium_yuan'] = matured_premium_series.astype(float) * 10000
-        else:
-            result_df['matured_premium_yuan'] = 0.0
-        
+        matured_yuan = matured_wan * 10000 if matured_wan is not None else np.zeros(row_count)
+
         # 3. 商业险折前保费(元) = 满期保费(元) / 商业险自主系数（避免除零）
-        if 'commercial_autonomous_coefficient' in df.columns:
-            coeff = pd.to_numeric(df['commercial_autonomous_coefficient'], errors='coerce').fillna(1.0)
-            coeff = coeff.replace(0, 1.0)  # 避免除零
-            result_df['commercial_premium_before_discount_yuan'] = result_df['matured_premium_yuan'] / coeff
+        if coeff is not None:
+            commercial_yuan = matured_yuan / np.where(coeff == 0, 1.0, coeff)
         else:
-            result_df['commercial_premium_before_discount_yuan'] = result_df['matured_premium_yuan']
-        
+            commercial_yuan = matured_yuan
+
         # 4. 保单数量 = 满期保费(元) / 单均保费（避免除零）
-        if 'average_premium' in df.columns:
-            avg_premium = pd.to_numeric(df['average_premium'], errors='coerce').fillna(1.0)
-            avg_premium = avg_premium.replace(0, 1.0)  # 避免除零
-            result_df['policy_count'] = (result_df['matured_premium_yuan'] / avg_premium).round().astype(int)
+        if avg_premium is not None:
+            # 除法结果作为临时数组原地取整，只分配一次中间数组
+            policy_count = np.divide(matured_yuan, np.where(avg_premium == 0, 1.0, avg_premium))
+            policy_count = np.rint(policy_count, out=policy_count).astype(np.int64)
         else:
-            result_df['policy_count'] = 1
-        
+            policy_count = 1
+
         # 5. 出险案件数 = 案件数
-        if 'claim_case_count' in df.columns:
-            claim_count_series = pd.to_numeric(df['claim_case_count'], errors='coerce').fillna(0)
-            result_df['claim_case_count'] = claim_count_series.astype(int)
-        else:
-            result_df['claim_case_count'] = 0
-        
+        claim_case_count = claim_count.astype(int) if claim_count is not None else 0
+
         # 6. 已报案赔付(元) = 总赔款(万) * 10000
-        if 'total_claim_wan' in df.columns:
-            total_claim_series = pd.to_numeric(df['total_claim_wan'], errors='coerce').fillna(0)
-            result_df['reported_claim_payment_yuan'] = total_claim_series.astype(float) * 10000
-        else:
-            result_df['reported_claim_payment_yuan'] = 0.0
-        
+        reported_yuan = total_claim_wan * 10000 if total_claim_wan is not None else np.zeros(row_count)
+
         # 7. 费用金额(元) = 签单保费(元) * 费用率 (修正：应使用签单保费而非满期保费)
-        if 'expense_ratio' in df.columns:
-            expense_ratio = pd.to_numeric(df['expense_ratio'], errors='coerce').fillna(0.0)
-            result_df['expense_amount_yuan'] = result_df['signed_premium_yuan'] * expense_ratio
-        else:
-            result_df['expense_amount_yuan'] = 0.0
-        
-        # 8. 保费计划(元) = 满期保费(元) * 保费计划系数
-        if 'premium_plan_coefficient' in df.columns:
-            plan_coeff = pd.to_numeric(df['premium_plan_coefficient'], errors='coerce').fillna(1.0)
-            result_df['premium_plan_yuan'] = result_df['matured_premium_yuan'] * plan_coeff
-        else:
-            # 如果没有保费计划系数，默认等于满期保费
-            result_df['premium_plan_yuan'] = result_df['matured_premium_yuan']
-        
+        expense_yuan = signed_yuan * expense_ratio if expense_ratio is not None else np.zeros(row_count)
+
+        # 8. 保费计划(元) = 满期保费(元) * 保费计划系数；没有系数时默认等于满期保费
+        plan_yuan = matured_yuan * plan_coeff if plan_coeff is not None else matured_yuan
+
         # 9. 边际贡献金额(元) = 满期保费(元) * (1 - 变动成本率)
-        if 'variable_cost_ratio' in df.columns:
-            variable_cost_ratio = pd.to_numeric(df['variable_cost_ratio'], errors='coerce').fillna(0.0)
-            result_df['marginal_contribution_amount_yuan'] = result_df['matured_premium_yuan'] * (1 - variable_cost_ratio)
+        if variable_cost_ratio is not None:
+            marginal_yuan = matured_yuan * (1 - variable_cost_ratio)
         else:
-            result_df['marginal_contribution_amount_yuan'] = result_df['matured_premium_yuan']
-        
+            marginal_yuan = matured_yuan
+
+        result_df['signed_premium_yuan'] = signed_yuan
+        result_df['matured_premium_yuan'] = matured_yuan
+        result_df['commercial_premium_before_discount_yuan'] = commercial_yuan
+        result_df['policy_count'] = policy_count
+        result_df['claim_case_count'] = claim_case_count
+        result_df['reported_claim_payment_yuan'] = reported_yuan
+        result_df['expense_amount_yuan'] = expense_yuan
+        result_df['premium_plan_yuan'] = plan_yuan
+        result_df['marginal_contribution_amount_yuan'] = marginal_yuan
+
         return result_df
 
     def finalize_output(self, df):
         """最终输出处理，确保字段顺序和数量正确"""
         try:
-            # 确保所有必需字段都存在
-            output_df = pd.DataFrame()
+            # 一次reindex按模板顺序取出全部必需字段，缺失字段以空值补齐
+            missing = [field for field in self.required_fields if field not in df.columns]
+            if missing:
+                logger.warning("缺少字段: %s", missing)
+            output_df = df.reindex(columns=self.required_fields)
             
-            for field in self.required_fields:
-                if field in df.columns:
-                    output_df[field] = df[field]
-                else:
-                    logger.warning(f"缺少字段: {field}")
-                    output_df[field] = None
-            
-            logger.info(f"最终输出字段: {list(output_df.columns)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("最终输出字段: %s", list(output_df.columns))
             return output_df
             
         except Exception as e:
-            logger.error(f"最终输出处理出错: {str(e)}")
+            logger.error("最终输出处理出错: %s", e)
             raise
 
-    def create_zip_package(self, output_files, original_filename=None):
+    def create_zip_package(self, output_files, original_filename=None, week_number=None):
         """
         创建包含所有CSV文件的ZIP压缩包
         """
         try:
-            # 从原始文件名提取周次信息
-            week_number = 40  # 默认值
-            if original_filename:
-                import re
-                week_match = re.search(r'第(\d+)周', original_filename)
-                if week_match:
-                    week_number = int(week_match.group(1))
+            # 未传入周次时从原始文件名提取
+            if week_number is None:
+                week_number = _extract_week(original_filename)
             
             # 生成ZIP文件名
             if len(output_files) > 1:
@@ -330,8 +389,8 @@ class DataProcessor:
             
             zip_path = os.path.join(OUTPUT_FOLDER, zip_filename)
             
-            # 创建ZIP文件
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            # 创建ZIP文件，CSV文本用最低压缩级别即可获得大部分压缩率，编码耗时远低于默认级别
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
                 for file_info in output_files:
                     csv_path = file_info['path']
                     csv_filename = file_info['filename']
@@ -339,11 +398,11 @@ class DataProcessor:
                     if os.path.exists(csv_path):
                         # 将CSV文件添加到ZIP中
                         zipf.write(csv_path, csv_filename)
-                        logger.info(f"已添加文件到ZIP: {csv_filename}")
+                        logger.info("已添加文件到ZIP: %s", csv_filename)
                     else:
-                        logger.warning(f"CSV文件不存在: {csv_path}")
+                        logger.warning("CSV文件不存在: %s", csv_path)
             
-            logger.info(f"ZIP文件创建成功: {zip_path}")
+            logger.info("ZIP文件创建成功: %s", zip_path)
             
             return {
                 'success': True,
@@ -353,7 +412,7 @@ class DataProcessor:
             }
             
         except Exception as e:
-            logger.error(f"创建ZIP文件时出错: {str(e)}")
+            logger.error("创建ZIP文件时出错: %s", e)
             return {
                 'success': False,
                 'message': f'创建ZIP文件失败: {str(e)}'
@@ -371,9 +430,7 @@ class DataProcessor:
                 years = sorted([int(year) for year in years if pd.notna(year)])
             else:
                 # 如果没有policy_start_year字段，尝试从原始文件名提取
-                import re
-                year_match = re.search(r'第(\d+)周', original_filename)
-                if year_match:
+                if _WEEK_RE.search(original_filename):
                     # 假设当前年份
                     years = [datetime.now().year]
                 else:
@@ -385,9 +442,7 @@ class DataProcessor:
                 week = int(weeks[0]) if len(weeks) > 0 else 40
             else:
                 # 尝试从原始文件名提取周数
-                import re
-                week_match = re.search(r'第(\d+)周', original_filename)
-                week = int(week_match.group(1)) if week_match else 40
+                week = _extract_week(original_filename)
             
             # 生成文件名
             if len(years) == 1:
@@ -396,91 +451,93 @@ class DataProcessor:
                 year_range = f"{min(years)}-{max(years)}"
                 filename = f"{year_range}保单第{week:02d}周变动成本明细表.csv"
             
-            logger.info(f"生成文件名: {filename}")
+            logger.info("生成文件名: %s", filename)
             return filename
             
         except Exception as e:
-            logger.error(f"生成文件名时出错: {str(e)}")
+            logger.error("生成文件名时出错: %s", e)
             # 返回默认文件名
             return f"保单第40周变动成本明细表.csv"
 
+    def read_excel(self, excel_path):
+        """读取Excel中会被使用的列，calamine 引擎读取失败时改用 pandas 默认引擎重试"""
+        if EXCEL_ENGINE is not None:
+            start = excel_path.tell() if hasattr(excel_path, 'seek') else None
+            try:
+                return pd.read_excel(excel_path, engine=EXCEL_ENGINE, usecols=self.is_used_column)
+            except Exception as e:
+                logger.warning("%s 引擎读取失败，改用默认引擎: %s", EXCEL_ENGINE, e)
+                if start is not None:
+                    excel_path.seek(start)
+        return pd.read_excel(excel_path, usecols=self.is_used_column)
+
     def process_excel_to_csv(self, excel_path, output_path=None, original_filename=None):
-        """处理Excel文件转换为CSV，按年度分组输出多个文件"""
+        """处理Excel文件转换为CSV，按年度分组输出多个文件
+
+        excel_path 可以是文件路径，也可以是可读的文件对象（如上传流）
+        """
         try:
             # 读取Excel文件
-            logger.info(f"读取Excel文件: {excel_path}")
-            df = pd.read_excel(excel_path)
-            logger.info(f"原始数据: {len(df)} 行, {len(df.columns)} 列")
+            # 上传流的 repr 没有意义，有原始文件名时记录文件名
+            logger.info("读取Excel文件: %s", original_filename or excel_path)
+            df = self.read_excel(excel_path)
+            logger.info("原始数据: %d 行, %d 列", len(df), len(df.columns))
             
-            # 标准化字段
-            df_standardized = self.standardize_fields(df, original_filename)
-            logger.info(f"标准化后: {len(df_standardized)} 行, {len(df_standardized.columns)} 列")
-            
-            # 计算绝对值字段
-            df_with_absolute = self.calculate_absolute_fields(df_standardized)
-            logger.info(f"计算绝对值字段后: {len(df_with_absolute)} 行, {len(df_with_absolute.columns)} 列")
-            
-            # 最终输出处理
-            df_final = self.finalize_output(df_with_absolute)
-            logger.info(f"最终输出: {len(df_final)} 行, {len(df_final.columns)} 列")
-            
-            # 按年度分组数据
-            if 'policy_start_year' not in df_final.columns:
-                logger.error("缺少policy_start_year字段，无法按年度分组")
-                return {
-                    'success': False,
-                    'message': '缺少保单年度字段，无法按年度分组输出'
-                }
-            
-            # 获取所有年度
-            years = df_final['policy_start_year'].dropna().unique()
-            years = sorted([int(year) for year in years if pd.notna(year)])
-            logger.info(f"发现年度: {years}")
-            
-            # 获取周数（用于文件命名）
-            week_number = 40  # 默认值
-            if 'week_number' in df_final.columns:
-                weeks = df_final['week_number'].dropna().unique()
-                if len(weeks) > 0:
-                    week_number = int(weeks[0])
-            else:
-                # 尝试从原始文件名提取周数
-                import re
-                week_match = re.search(r'第(\d+)周', original_filename or excel_path)
-                if week_match:
-                    week_number = int(week_match.group(1))
-            
-            # 为每个年度生成单独的文件
+            # 分块执行字段转换并按年度追加写出，转换产生的中间数据只占用一个分块的内存
+            year_handles = {}
+            year_rows = {}
+            # 周次只取决于原始文件名，在此提取一次并传给各步骤；文件名模板也只生成一次
+            week_number = _extract_week(original_filename)
+            name_template = f"{{}}保单第{week_number:02d}周变动成本明细表.csv"
+            field_count = 0
+            try:
+                # 各年度写入不同文件，互不依赖，用线程池并行写出；每个分块写完再处理下一块，保证同一文件内行序不变
+                with ThreadPoolExecutor(max_workers=CSV_WRITE_WORKERS) as pool:
+                    for start in range(0, len(df), PROCESS_CHUNK_ROWS):
+                        chunk = self.standardize_fields(df.iloc[start:start + PROCESS_CHUNK_ROWS], week_number=week_number)
+                        chunk = self.calculate_absolute_fields(chunk)
+                        chunk = self.finalize_output(chunk)
+                        field_count = len(chunk.columns)
+
+                        writes = []
+                        for year, year_data in chunk.groupby('policy_start_year', sort=False):
+                            year = int(year)
+                            handle = year_handles.get(year)
+                            write_header = handle is None
+                            if write_header:
+                                year_output_path = os.path.join(OUTPUT_FOLDER, name_template.format(year))
+                                handle = open(year_output_path, 'w', encoding='utf-8-sig', newline='')
+                                year_handles[year] = handle
+                            writes.append(pool.submit(year_data.to_csv, handle, index=False, header=write_header))
+                            year_rows[year] = year_rows.get(year, 0) + len(year_data)
+                        for write in writes:
+                            write.result()
+            finally:
+                for handle in year_handles.values():
+                    handle.close()
+            del df
+
+            # 验证字段数量，各年度共用同一组输出列，只需检查一次
+            if year_rows and field_count != 26:
+                logger.warning("字段数量不符合规范: 期望26个，实际%d个", field_count)
+
+            years = sorted(year_rows)
+            logger.info("发现年度: %s", years)
+
             output_files = []
             total_rows = 0
-            
             for year in years:
-                # 筛选当前年度的数据
-                year_data = df_final[df_final['policy_start_year'] == year].copy()
-                
-                if len(year_data) == 0:
-                    logger.warning(f"{year}年度没有数据")
-                    continue
-                
-                # 生成文件名
-                output_filename = f"{year}保单第{week_number:02d}周变动成本明细表.csv"
+                output_filename = name_template.format(year)
                 year_output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-                
-                # 验证字段数量
-                if len(year_data.columns) != 26:
-                    logger.warning(f"{year}年度字段数量不符合规范: 期望26个，实际{len(year_data.columns)}个")
-                
-                # 保存CSV文件
-                year_data.to_csv(year_output_path, index=False, encoding='utf-8-sig')
-                logger.info(f"{year}年度CSV文件已保存: {year_output_path} ({len(year_data)}行)")
-                
+                logger.info("%s年度CSV文件已保存: %s (%d行)", year, year_output_path, year_rows[year])
+
                 output_files.append({
                     'year': year,
                     'filename': output_filename,
                     'path': year_output_path,
-                    'row_count': len(year_data)
+                    'row_count': year_rows[year]
                 })
-                total_rows += len(year_data)
+                total_rows += year_rows[year]
             
             if not output_files:
                 return {
@@ -489,20 +546,20 @@ class DataProcessor:
                 }
 
             # 创建ZIP压缩包
-            zip_result = self.create_zip_package(output_files, original_filename)
+            zip_result = self.create_zip_package(output_files, week_number=week_number)
             
             return {
                 'success': True,
                 'message': f'成功处理 {total_rows} 行数据，按年度输出 {len(output_files)} 个文件',
                 'output_files': output_files,
-                'field_count': len(df_final.columns),
+                'field_count': field_count,
                 'total_row_count': total_rows,
                 'years_processed': years,
                 'zip_info': zip_result
             }
             
         except Exception as e:
-            logger.error(f"处理文件时出错: {str(e)}")
+            logger.error("处理文件时出错: %s", e)
             return {
                 'success': False,
                 'message': f'处理失败: {str(e)}'
@@ -530,14 +587,11 @@ def upload_file():
         if not file.filename or not file.filename.lower().endswith(('.xlsx', '.xls')):
             return jsonify({'success': False, 'message': '请上传Excel文件'})
         
-        # 保存上传的文件
         filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        upload_path = os.path.join(UPLOAD_FOLDER, f"{timestamp}_{filename}")
-        file.save(upload_path)
         
-        # 处理文件
-        result = processor.process_excel_to_csv(upload_path, None, filename)
+        # 直接从上传流读取处理，不再额外落盘一份Excel副本；表单解析后流的位置不一定在开头，先回到开头
+        file.stream.seek(0)
+        result = processor.process_excel_to_csv(file.stream, None, filename)
         
         if result['success']:
             # 只添加ZIP文件下载链接，移除单独文件下载逻辑
@@ -547,7 +601,7 @@ def upload_file():
         return jsonify(result)
         
     except Exception as e:
-        logger.error(f"上传处理出错: {str(e)}")
+        logger.error("上传处理出错: %s", e)
         return jsonify({'success': False, 'message': f'处理失败: {str(e)}'})
 
 @app.route('/download/<filename>')
@@ -560,9 +614,11 @@ def download_file(filename):
         else:
             return jsonify({'error': '文件不存在'}), 404
     except Exception as e:
-        logger.error(f"下载文件出错: {str(e)}")
+        logger.error("下载文件出错: %s", e)
         return jsonify({'error': '下载失败'}), 500
 
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 5001))
-    app.run(debug=True, host='0.0.0.0', port=port)
\ No newline at end of file
+    # 本地开发服务器；生产环境使用 gunicorn -c gunicorn_conf.py wsgi:app（见 Procfile），端口同样取自 PORT
+    port = int(os.environ.get('PORT', 5000))
+    debug = os.environ.get('DEBUG', 'False').lower() == 'true'
+    app.run(debug=debug, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -3,81 +3,281 @@
 
 import io
 import os
+import re
+import csv
+import fnmatch
+import heapq
+import hashlib
+import tempfile
 import sys
 import json
+import types
+import platform
 import time
+import shutil
 import zipfile
+import queue
+import atexit
+import threading
 import logging
 import traceback
+import multiprocessing
+from collections import defaultdict
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from typing import Any, Dict
 from datetime import datetime
+from functools import lru_cache
 import numpy as np
+import openpyxl
 
-from flask import Flask, render_template, request, send_file, redirect, url_for, flash, jsonify
+try:
+    import pandas as pd
+    _HAS_PANDAS = True
+except ImportError:  # 缺少 pandas 时 Excel 转换仅生成示例文件
+    pd = None
+    _HAS_PANDAS = False
+
+try:
+    import polars as pl
+except ImportError:  # polars 为可选依赖，缺失时回退到 openpyxl 流式转换
+    pl = None
+
+try:
+    import python_calamine
+except ImportError:  # python-calamine 为可选依赖，pandas 读取 Excel 时使用
+    python_calamine = None
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时回退到标准库 json
+    orjson = None
+
+try:
+    import pyarrow
+except ImportError:  # pyarrow 为可选依赖，缺失时不输出 Parquet
+    pyarrow = None
+
+from flask import Flask, Request, Response, make_response, render_template, request, send_file, redirect, url_for, flash, jsonify, session
+from flask.json.provider import DefaultJSONProvider
+from jinja2 import FileSystemBytecodeCache
+
+try:
+    from flask_compress import Compress
+except ImportError:  # Flask-Compress 为可选依赖，缺失时不压缩响应
+    Compress = None
 
 # 自定义JSON编码器处理numpy和pandas数据类型
 class NumpyEncoder(json.JSONEncoder):
     """
     自定义JSON编码器，处理numpy和pandas数据类型的序列化
     """
+    # 按精确类型查表转换，常见类型只需一次字典查找
+    _DISPATCH = {
+        **dict.fromkeys((np.int8, np.int16, np.int32, np.int64,
+                         np.uint8, np.uint16, np.uint32, np.uint64), int),
+        **dict.fromkeys((np.float16, np.float32, np.float64), float),
+        np.bool_: bool,
+        np.ndarray: np.ndarray.tolist,
+        set: list,
+        datetime: datetime.isoformat,
+    }
+
     def default(self, obj):
-        # 处理numpy整数类型
-        if isinstance(obj, (np.integer, np.int8, np.int16, np.int32, np.int64)):
+        convert = self._DISPATCH.get(type(obj))
+        if convert is not None:
+            return convert(obj)
+        # 查表未命中的子类型：其他numpy标量、pandas Timestamp 等
+        if isinstance(obj, np.integer):
             return int(obj)
-        # 处理numpy浮点类型
-        elif isinstance(obj, (np.floating, np.float16, np.float32, np.float64)):
+        if isinstance(obj, np.floating):
             return float(obj)
-        # 处理numpy数组
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        # 处理pandas数据类型
-        elif hasattr(obj, 'dtype'):
-            if 'int' in str(obj.dtype):
-                return int(obj)
-            elif 'float' in str(obj.dtype):
-                return float(obj)
-        # 处理有item方法的对象（如numpy标量）
-        elif hasattr(obj, 'item'):
-            return obj.item()
-        # 处理set类型
-        elif isinstance(obj, set):
-            return list(obj)
-        # 处理datetime类型
-        elif isinstance(obj, datetime):
+        if isinstance(obj, datetime):
             return obj.isoformat()
+        if isinstance(obj, (set, frozenset)):
+            return list(obj)
+        if hasattr(obj, 'item'):
+            return obj.item()
         return super().default(obj)
 
 
+def dump_json(obj, path, pretty=True):
+    """将报告/元数据写入JSON文件，优先使用 orjson；pretty=False 时写出无缩进的紧凑格式，供程序读取的大文件使用"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        data = orjson.dumps(obj, default=NumpyEncoder().default, option=option)
+        with open(path, 'wb') as f:
+            f.write(data)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            if pretty:
+                json.dump(obj, f, ensure_ascii=False, indent=2, cls=NumpyEncoder)
+            else:
+                json.dump(obj, f, ensure_ascii=False, separators=(',', ':'), cls=NumpyEncoder)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify 使用 orjson 序列化，未支持的类型依次交给 Flask 默认处理和 NumpyEncoder"""
+
+    _numpy_encoder = NumpyEncoder()
+
+    def _default(self, obj):
+        try:
+            return DefaultJSONProvider.default(obj)
+        except TypeError:
+            return self._numpy_encoder.default(obj)
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self._default, option=option).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 APP_NAME = "数据预处理器"
 
+# 工作簿读取配置目录：<文件名>.json 可指定 {"dtype": {...}, "usecols": [...]}
+SCHEMA_DIR = Path(__file__).resolve().parent / "数据转换" / "schemas"
+
+class DiscardFileStream(io.RawIOBase):
+    """丢弃写入内容的文件流，用于只需要文件名的上传端点"""
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, b):
+        return len(b)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return 0
+
+    def read(self, size=-1):
+        return b""
+
+
+# 只需要上传文件名、不读取文件内容的端点
+FILENAME_ONLY_ENDPOINTS = frozenset({"api_upload", "debug_info"})
+
+
+class DataForgeRequest(Request):
+    """
+    只回显文件名的端点在解析时不把文件内容写入内存或临时文件；
+    其余请求较小时留在内存，较大时直接写入真实临时文件，保存时可用 sendfile
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint in FILENAME_ONLY_ENDPOINTS:
+            return DiscardFileStream()
+        # 与 werkzeug 默认的内存阈值一致，但不用 SpooledTemporaryFile，落盘与否在创建时即确定
+        if total_content_length is None or total_content_length > UPLOAD_MEMORY_MAX_SIZE:
+            return tempfile.TemporaryFile("rb+")
+        return io.BytesIO()
+
+
 app = Flask(__name__)
+app.request_class = DataForgeRequest
 app.secret_key = os.environ.get("DATA_PREPROCESSOR_SECRET", "dev-secret")
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB限制，超出直接返回413
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 3600  # 静态资源缓存1小时
+
+# 模板编译结果缓存到磁盘，新启动的 worker 无需重新解析模板
+JINJA_CACHE_DIR = Path("/tmp/jinja_cache")
+JINJA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(JINJA_CACHE_DIR))
+
+# HTML/JSON 响应压缩（zip 下载已压缩，不在默认 mimetype 列表中）
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 512
+if Compress is not None:
+    Compress(app)
+
+# 上传、转换、输出使用的临时目录，启动时创建，请求中不再重复 mkdir
+UPLOAD_DIR = Path("/tmp/uploads")
+CONVERTED_DIR = Path("/tmp/converted")
+OUTPUT_DIR = Path("/tmp/output")
+for _work_dir in (UPLOAD_DIR, CONVERTED_DIR, OUTPUT_DIR):
+    _work_dir.mkdir(parents=True, exist_ok=True)
+
+# 已生成的下载 zip 缓存目录，文件名为输出目录内容指纹
+ZIP_CACHE_DIR = Path("/tmp/zip_cache")
+# 部署在 Nginx 后时设置（如 "/internal/"），由 Nginx 通过 X-Accel-Redirect 直接发送缓存文件
+ZIP_ACCEL_REDIRECT_PREFIX = os.environ.get("ZIP_ACCEL_REDIRECT_PREFIX")
+
+# 流式打包时每次发送的字节块大小，以及压缩线程最多领先发送的块数
+ZIP_STREAM_CHUNK_SIZE = 64 * 1024
+ZIP_STREAM_QUEUE_CHUNKS = 16
+# 打包时不再压缩的文件类型
+ZIP_STORED_SUFFIXES = frozenset({".xlsx", ".zip", ".gz", ".png", ".jpg", ".jpeg", ".parquet"})
+
+# 上传文件写盘缓冲区大小
+UPLOAD_COPY_BUFSIZE = 1024 * 1024
+# 请求体不超过该大小时上传文件保存在内存中
+UPLOAD_MEMORY_MAX_SIZE = 500 * 1024
+# Polars/pandas 写 CSV 的每批行数
+CSV_WRITE_BATCH_SIZE = 100_000
+# 设置 OUTPUT_PARQUET=true 时（需安装 pyarrow）在规范CSV之外额外输出同名 Parquet 文件
+OUTPUT_PARQUET = os.environ.get("OUTPUT_PARQUET", "false").lower() == "true"
 
 # 配置增强的日志记录系统
 def setup_logging():
     """
     配置增强的日志记录系统
     支持文件日志和控制台日志，包含详细的错误追踪
+    主进程中日志记录只入队，由后台线程统一写文件和控制台
     """
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
     
     # 创建日志格式
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler(log_dir / f"data_processor_{datetime.now().strftime('%Y%m%d')}.log", encoding='utf-8'),
+        logging.StreamHandler(sys.stdout)
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
     
-    # 配置根日志记录器
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        handlers=[
-            logging.FileHandler(log_dir / f"data_processor_{datetime.now().strftime('%Y%m%d')}.log", encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    # 配置根日志记录器，与 basicConfig 一致：已有处理器时不重复配置
+    root = logging.getLogger()
+    if not root.handlers:
+        root.setLevel(logging.INFO)
+        if multiprocessing.parent_process() is None:
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, *handlers)
+            listener.start()
+            atexit.register(listener.stop)
+            root.addHandler(QueueHandler(log_queue))
+            # 进程池子进程退出时不会执行 atexit，fork 出的子进程改为直接写日志，避免丢失队列中的记录
+            os.register_at_fork(after_in_child=lambda: _use_direct_log_handlers(root, handlers))
+        else:
+            for handler in handlers:
+                root.addHandler(handler)
     
     return logging.getLogger(__name__)
 
+
+def _use_direct_log_handlers(root, handlers):
+    """fork 后的子进程中没有队列监听线程，把根日志记录器的处理器换回同步处理器"""
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+
 # 初始化日志记录器
 logger = setup_logging()
 
@@ -106,7 +306,8 @@ class EnhancedErrorHandler:
             "error_type": type(error).__name__ if hasattr(error, '__class__') else "Unknown",
             "error_message": str(error),
             "context": context or {},
-            "traceback": traceback.format_exc() if hasattr(error, '__traceback__') else None
+            # 只有正在处理异常时才格式化调用栈，字符串错误信息无需遍历栈帧
+            "traceback": traceback.format_exc() if sys.exc_info()[0] is not None else None
         }
         
         self.error_log.append(error_info)
@@ -140,7 +341,7 @@ class EnhancedErrorHandler:
         return {
             "total_errors": len(self.error_log),
             "total_warnings": len(self.warning_log),
-            "error_types": list(set([e["error_type"] for e in self.error_log])),
+            "error_types": list({e["error_type"] for e in self.error_log}),
             "recent_errors": self.error_log[-5:] if self.error_log else [],
             "recent_warnings": self.warning_log[-5:] if self.warning_log else []
         }
@@ -155,8 +356,7 @@ class EnhancedErrorHandler:
         }
         
         report_file = Path(output_dir) / "error_report.json"
-        with open(report_file, 'w', encoding='utf-8') as f:
-            json.dump(error_report, f, ensure_ascii=False, indent=2, cls=NumpyEncoder)
+        dump_json(error_report, report_file)
         
         logger.info(f"错误报告已保存至: {report_file}")
         return report_file
@@ -179,21 +379,18 @@ def strftime_filter(format_string):
     return datetime.now().strftime(format_string)
 
 
+@lru_cache(maxsize=1)
 def load_preprocessor_module():
-    """动态加载数据预处理模块，如果不存在则使用内置模拟功能"""
+    """
+    动态加载数据预处理模块，如果不存在则使用内置模拟功能
+    模块本身无状态，每个进程只构建一次；开发时可通过 /admin/reload 清除缓存
+    """
     # 在云端环境中，强制使用内置模拟功能以确保兼容性
     return create_mock_preprocessor()
 
 
 def create_mock_preprocessor():
     """创建符合处理规范的数据处理模块"""
-    import types
-    import csv
-    import pandas as pd
-    import numpy as np
-    from datetime import datetime, timedelta
-    import re
-
     module = types.ModuleType("enhanced_preprocessor")
 
     # 17个筛选维度字段映射表
@@ -226,6 +423,71 @@ def create_mock_preprocessor():
         1: True, 0: False
     }
 
+    # 字段名与文件名解析用到的正则，预编译后复用
+    _CHINESE_RE = re.compile(r'[\u4e00-\u9fff]')
+    _NONALNUM_RE = re.compile(r'[^a-zA-Z0-9\u4e00-\u9fff]')
+    _YEAR_RE = re.compile(r'(\d{4})')
+    _WEEK_RE = re.compile(r'第(\d+)周')
+    # 输出数据文件的规范命名：YYYY保单第WW周变动成本明细表.csv
+    _WEEK_FILE_RE = re.compile(r'(\d{4})保单第(\d+)周变动成本明细表\.csv')
+
+    # 输出目录文件索引缓存：目录 -> (目录 mtime_ns, 文件索引)
+    # 数据文件都以原子替换方式写出，增删改都会更新目录 mtime，据此判断缓存是否有效
+    _FILE_INDEX_CACHE = {}
+    _FILE_INDEX_CACHE_MAXSIZE = 16
+    # 扫描时目录 mtime 距当前不足该时长则不缓存，避免同一时间粒度内的后续修改被漏掉
+    _FILE_INDEX_RACY_NS = 1_000_000_000
+
+    # 字段名翻译的简单映射
+    NAME_TRANSLATION_MAP = {
+        '保费': 'premium',
+        '件数': 'count',
+        '金额': 'amount',
+        '数量': 'quantity',
+        '率': 'ratio',
+        '时间': 'time',
+        '日期': 'date',
+        '类型': 'type',
+        '状态': 'status'
+    }
+
+    # 各文件的表头大多相同，字段名判断和翻译结果在进程内缓存复用
+    @lru_cache(maxsize=1024)
+    def contains_chinese(text):
+        """检查字符串是否包含中文"""
+        return bool(_CHINESE_RE.search(text))
+
+    @lru_cache(maxsize=1024)
+    def generate_english_name(chinese_name):
+        """为中文字段名生成英文名"""
+        english_name = chinese_name
+        for chinese, english in NAME_TRANSLATION_MAP.items():
+            english_name = english_name.replace(chinese, english)
+
+        # 移除特殊字符，使用下划线连接
+        english_name = _NONALNUM_RE.sub('_', english_name)
+        english_name = english_name.lower().strip('_')
+
+        # 如果仍然包含中文，使用通用名称
+        if contains_chinese(english_name):
+            english_name = f"field_{len(english_name)}"
+
+        return english_name
+
+    def most_common_int(series, max_span=100_000):
+        """
+        返回列中出现次数最多的数值（取整），并列时取较小值，与 Series.mode().iloc[0] 一致；无有效数值时返回 None
+        年度、周次这类取值范围小的整数用 bincount 单次计数，避免 mode 的排序
+        """
+        values = pd.to_numeric(series, errors='coerce').dropna().to_numpy(dtype='float64')
+        if len(values) == 0:
+            return None
+        low, high = values.min(), values.max()
+        if high - low < max_span and np.array_equal(values, np.trunc(values)):
+            low = int(low)
+            return int(np.bincount((values - low).astype(np.int64)).argmax()) + low
+        return int(pd.Series(values).mode().iloc[0])
+
     def standardize_boolean_value(value):
         """标准化布尔值"""
         if pd.isna(value):
@@ -234,12 +496,33 @@ def create_mock_preprocessor():
             value = value.strip()
         return BOOLEAN_VALUE_MAP.get(value, False)
 
+    def standardize_boolean_series(series):
+        """按列标准化布尔值，结果与逐值调用 standardize_boolean_value 一致"""
+        if pd.api.types.is_bool_dtype(series):
+            return series.fillna(False).astype(bool)
+        # 字典批量查找，未匹配的值（含空值）视为 False
+        mapped = series.map(BOOLEAN_VALUE_MAP)
+        if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            # 未命中的非空值中，字符串去除两端空白后再查找一次；object 列可能混有真实布尔值，只处理其中的字符串
+            missed = (mapped.isna() & series.notna()).to_numpy()
+            if missed.any():
+                candidates = series[missed]
+                positions = np.flatnonzero(missed)
+                if pd.api.types.infer_dtype(candidates, skipna=True) != 'string':
+                    is_str = candidates.map(type).eq(str).to_numpy()
+                    candidates, positions = candidates[is_str], positions[is_str]
+                if len(candidates):
+                    mapped = mapped.astype(object)
+                    mapped.iloc[positions] = candidates.str.strip().map(BOOLEAN_VALUE_MAP).to_numpy()
+        return mapped.eq(True)
+
     def calculate_absolute_fields(df):
         """
         计算8个绝对值字段 - 严格按照处理规范.md要求
         移除保费计划字段，只保留8个核心绝对值字段
         """
-        result_df = df.copy()
+        # 浅拷贝共享原有列的数据，只新增/替换计算字段，不修改传入的DataFrame
+        result_df = df.copy(deep=False)
 
         # 按照处理规范.md定义的源字段映射
         possible_source_fields = {
@@ -254,12 +537,12 @@ def create_mock_preprocessor():
             'average_premium': ['单均保费', 'average_premium', '平均保费']
         }
 
+        # 列名集合只构建一次，候选字段按哈希查找
+        columns = set(df.columns)
+
         def find_field(field_list):
-            """u5728数据中查找匹配的字段名"""
-            for field_name in field_list:
-                if field_name in df.columns:
-                    return field_name
-            return None
+            """在数据中查找匹配的字段名"""
+            return next((field_name for field_name in field_list if field_name in columns), None)
 
         def is_wan_yuan_unit(series, field_name):
             """判断是否为万元单位"""
@@ -302,11 +585,12 @@ def create_mock_preprocessor():
             # 通过单均保费计算
             avg_field = find_field(possible_source_fields['average_premium'])
             if avg_field:
-                avg_premium = pd.to_numeric(df[avg_field], errors='coerce')
-                valid_avg = (avg_premium > 0) & (~pd.isna(avg_premium))
-                result_df['policy_count'] = 0
-                result_df.loc[valid_avg, 'policy_count'] = \
-                    (result_df.loc[valid_avg, 'signed_premium_yuan'] / avg_premium.loc[valid_avg]).round().astype(int)
+                # 在numpy数组上一次完成除法、取整和无效值置0，避免布尔索引的对齐和分段赋值
+                avg_premium = pd.to_numeric(df[avg_field], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+                valid_avg = avg_premium > 0
+                signed_yuan = result_df['signed_premium_yuan'].to_numpy(dtype='float64')
+                policy_count = np.rint(np.divide(signed_yuan, avg_premium, out=np.zeros_like(avg_premium), where=valid_avg))
+                result_df['policy_count'] = policy_count.astype(int)
             else:
                 # 估算：假设平均保赥20000元
                 result_df['policy_count'] = (result_df['signed_premium_yuan'] / 20000).round().astype(int)
@@ -346,11 +630,15 @@ def create_mock_preprocessor():
         # 7. 商业险折前保费
         coeff_field = find_field(possible_source_fields['commercial_coeff'])
         if coeff_field:
-            coeff = pd.to_numeric(df[coeff_field], errors='coerce')
-            valid_coeff = (coeff > 0) & (~pd.isna(coeff))
-            result_df['commercial_premium_before_discount_yuan'] = result_df['signed_premium_yuan'].copy()
-            result_df.loc[valid_coeff, 'commercial_premium_before_discount_yuan'] = \
-                result_df.loc[valid_coeff, 'signed_premium_yuan'] / coeff.loc[valid_coeff]
+            # 系数有效处为 签单保费/系数，其余保持签单保费，一次完成
+            coeff = pd.to_numeric(df[coeff_field], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+            signed = result_df['signed_premium_yuan']
+            signed_yuan = signed.to_numpy(dtype='float64')
+            commercial = np.divide(signed_yuan, coeff, out=signed_yuan.copy(), where=coeff > 0)
+            if pd.api.types.is_integer_dtype(signed) and np.array_equal(commercial, np.trunc(commercial)):
+                # 整数签单保费且结果均为整数时保持整数类型
+                commercial = commercial.astype(signed.dtype)
+            result_df['commercial_premium_before_discount_yuan'] = commercial
         else:
             # 默认使用签单保费（假设系数为1）
             result_df['commercial_premium_before_discount_yuan'] = result_df['signed_premium_yuan']
@@ -374,61 +662,244 @@ def create_mock_preprocessor():
 
     module = types.ModuleType("enhanced_preprocessor")
 
-    def convert_excel_to_csv(excel_dir, csv_dir):
-        """Excel到CSV转换功能，支持多sheet和数据清洗"""
-        from pathlib import Path
-        excel_dir = Path(excel_dir)
-        csv_dir = Path(csv_dir)
-        csv_dir.mkdir(parents=True, exist_ok=True)
-
-        converted = []
-        try:
-            import pandas as pd
-            for excel_file in excel_dir.glob("*.xlsx"):
-                try:
-                    # 读取Excel文件的所有sheet
-                    excel_data = pd.read_excel(excel_file, sheet_name=None)
+    def load_excel_schema(excel_file):
+        """读取工作簿对应的 schema 配置（dtype/usecols），不存在时返回空字典"""
+        schema_file = SCHEMA_DIR / f"{excel_file.stem}.json"
+        if not schema_file.exists():
+            return {}
+        with open(schema_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def convert_excel_with_polars(excel_file, csv_dir, schema):
+        """使用 Polars (calamine 引擎) 读取全部 sheet 并直接写出 CSV"""
+        # pandas 风格的 dtype 名称映射为 Polars 类型，未识别的按字符串读取
+        polars_dtypes = {
+            'float64': pl.Float64, 'float': pl.Float64, 'int64': pl.Int64, 'Int64': pl.Int64,
+            'int': pl.Int64, 'bool': pl.Boolean, 'str': pl.Utf8, 'string': pl.Utf8, 'object': pl.Utf8
+        }
+        read_options = {}
+        if schema.get("usecols"):
+            read_options["columns"] = schema["usecols"]
+        if schema.get("dtype"):
+            read_options["schema_overrides"] = {
+                column: polars_dtypes.get(dtype, pl.Utf8) for column, dtype in schema["dtype"].items()
+            }
 
-                    for sheet_name, df in excel_data.items():
-                        if df.empty:
-                            continue
+        excel_data = pl.read_excel(excel_file, sheet_id=0, engine="calamine", raise_if_empty=False,
+                                   **read_options)
 
-                        # 数据清洗：去除空行空列
-                        df = df.dropna(how='all').dropna(axis=1, how='all')
+        written = []
+        for sheet_name, df in excel_data.items():
+            if df.is_empty():
+                continue
 
-                        # 标准化列名：去除前后空格
-                        df.columns = df.columns.astype(str).str.strip()
+            # 数据清洗：去除空行空列
+            df = df.filter(~pl.all_horizontal(pl.all().is_null()))
+            df = df.select([s.name for s in df.get_columns() if s.null_count() < df.height])
 
-                        # 保存为CSV
-                        if len(excel_data) > 1:
-                            csv_file = csv_dir / f"{excel_file.stem}_{sheet_name}.csv"
-                        else:
-                            csv_file = csv_dir / f"{excel_file.stem}.csv"
+            # 标准化列名：去除前后空格
+            df = df.rename({c: c.strip() for c in df.columns})
 
-                        df.to_csv(csv_file, index=False, encoding='utf-8-sig')
+            if len(excel_data) > 1:
+                csv_file = csv_dir / f"{excel_file.stem}_{sheet_name}.csv"
+            else:
+                csv_file = csv_dir / f"{excel_file.stem}.csv"
 
-                    converted.append(excel_file.name)
-                except Exception as e:
-                    print(f"转换失败 {excel_file.name}: {e}")
-        except ImportError:
-            # 如果没有pandas，创建示例文件
-            for excel_file in excel_dir.glob("*.xlsx"):
+            # Polars 不支持 utf-8-sig，手动写入 BOM 以保持 Excel 兼容；大批次写出减少分块开销
+            with open(csv_file, 'wb') as f:
+                f.write(b'\xef\xbb\xbf')
+                df.write_csv(f, batch_size=CSV_WRITE_BATCH_SIZE)
+            written.append(csv_file)
+        return written
+
+    def convert_excel_with_pandas(excel_file, csv_dir, schema):
+        """使用 pandas (calamine 引擎) 读取全部 sheet 并写出 CSV"""
+        excel_data = pd.read_excel(excel_file, sheet_name=None, engine="calamine",
+                                   usecols=schema.get("usecols"), dtype=schema.get("dtype"))
+
+        written = []
+        for sheet_name, df in excel_data.items():
+            # 数据清洗：去除空行空列
+            df = df.dropna(how='all').dropna(axis=1, how='all')
+            if df.empty:
+                continue
+
+            # 标准化列名：去除前后空格
+            df.columns = df.columns.str.strip()
+
+            if len(excel_data) > 1:
+                csv_file = csv_dir / f"{excel_file.stem}_{sheet_name}.csv"
+            else:
                 csv_file = csv_dir / f"{excel_file.stem}.csv"
+
+            # 分块写出，避免一次性格式化整张表
+            df.to_csv(csv_file, index=False, encoding='utf-8-sig', lineterminator='\n',
+                      chunksize=CSV_WRITE_BATCH_SIZE)
+            written.append(csv_file)
+        return written
+
+    def convert_excel_with_openpyxl(excel_file, csv_dir, schema):
+        """
+        使用 openpyxl 只读模式逐行读取并流式写出 CSV，内存占用不随行数增长
+        清洗规则与 pandas 版本一致：去除空行空列、列名去除前后空格
+        """
+        wb = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+        written = []
+        try:
+            for ws in wb.worksheets:
+                rows = ws.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    continue
+
+                # 第一遍：找出至少包含一个值的列，等价于 dropna(axis=1, how='all')
+                used_columns = set()
+                for row in rows:
+                    used_columns.update(i for i, value in enumerate(row) if value is not None)
+                if schema.get("usecols"):
+                    wanted = {str(column).strip() for column in schema["usecols"]}
+                    used_columns = {
+                        i for i in used_columns
+                        if i < len(header) and header[i] is not None and str(header[i]).strip() in wanted
+                    }
+                if not used_columns:
+                    continue
+                keep = sorted(used_columns)
+
+                if len(wb.sheetnames) > 1:
+                    csv_file = csv_dir / f"{excel_file.stem}_{ws.title}.csv"
+                else:
+                    csv_file = csv_dir / f"{excel_file.stem}.csv"
+
+                # 第二遍：逐行写出，跳过全空行
                 with open(csv_file, 'w', encoding='utf-8-sig', newline='') as f:
-                    writer = csv.writer(f)
-                    # 创建符合规范的示例数据
-                    headers = ['刷新时间', '保险起期', '业务类型分类', '签单保费(万)', '满期保费(万)',
-                              '赔案件数', '总赔款(万)', '费用率', '周次']
-                    writer.writerow(headers)
-                    writer.writerow(['2025-01-01', 2025, '机动车辆保险', 100.5, 95.2, 3, 45.8, 0.15, 1])
+                    writer = csv.writer(f, lineterminator='\n')
+                    writer.writerow([
+                        str(header[i]).strip() if i < len(header) and header[i] is not None else f"Unnamed: {i}"
+                        for i in keep
+                    ])
+                    for row in ws.iter_rows(min_row=2, values_only=True):
+                        values = [row[i] if i < len(row) else None for i in keep]
+                        if any(value is not None for value in values):
+                            writer.writerow(values)
+                written.append(csv_file)
+        finally:
+            wb.close()
+        return written
+
+    def convert_excel_file(excel_file, csv_dir):
+        """
+        转换单个Excel文件的所有sheet，依次尝试 Polars、pandas+calamine，最后回退到openpyxl流式转换
+        返回写出的 CSV 文件路径列表
+        """
+        schema = load_excel_schema(excel_file)
+
+        if pl is not None:
+            try:
+                return convert_excel_with_polars(excel_file, csv_dir, schema)
+            except Exception as e:
+                logger.warning(f"Polars 转换失败，尝试回退 {excel_file.name}: {e}")
+
+        if python_calamine is not None:
+            try:
+                return convert_excel_with_pandas(excel_file, csv_dir, schema)
+            except Exception as e:
+                logger.warning(f"calamine 转换失败，回退到 openpyxl {excel_file.name}: {e}")
+
+        return convert_excel_with_openpyxl(excel_file, csv_dir, schema)
+
+    def scan_files(directory, suffix):
+        """单次 scandir 列出目录下指定后缀的文件，按文件名排序返回 DirEntry；目录不存在时返回空列表"""
+        try:
+            with os.scandir(directory) as entries:
+                files = [e for e in entries if e.name.endswith(suffix) and e.is_file()]
+        except FileNotFoundError:
+            return []
+        files.sort(key=lambda e: e.name)
+        return files
+
+    def split_excel_files(excel_dir, csv_dir):
+        """按文件名顺序区分 Excel 文件：返回 (CSV 比 Excel 新、无需转换的文件名列表, 待转换的 Excel 路径列表)"""
+        up_to_date = []
+        pending = []
+        for entry in scan_files(excel_dir, ".xlsx"):
+            excel_file = Path(entry.path)
+            csv_file = csv_dir / f"{excel_file.stem}.csv"
+            try:
+                if csv_file.stat().st_mtime >= entry.stat().st_mtime:
+                    up_to_date.append(excel_file.name)
+                    continue
+            except FileNotFoundError:
+                pass
+            pending.append(excel_file)
+        return up_to_date, pending
+
+    def collect_conversions(up_to_date, excel_files, errors, skipped=None):
+        """
+        汇总转换结果，返回转换的文件名列表：先是无需转换的文件，再按顺序列出转换成功的文件
+        errors 与 excel_files 一一对应，成功时为 None；跳过的文件名追加到 skipped 列表（如提供）
+        """
+        converted = list(up_to_date)
+        if skipped is not None:
+            skipped.extend(up_to_date)
+        for excel_file, error in zip(excel_files, errors):
+            if error is None:
                 converted.append(excel_file.name)
+            else:
+                logger.error(f"转换失败 {excel_file.name}: {error}")
+        return converted
+
+    def convert_excel_to_csv(excel_dir, csv_dir, skipped=None):
+        """Excel到CSV转换功能，支持多sheet和数据清洗，多个文件时并行转换
+
+        CSV 比 Excel 新时跳过转换，跳过的文件名追加到 skipped 列表（如提供）
+        """
+        excel_dir = Path(excel_dir)
+        csv_dir = Path(csv_dir)
+        csv_dir.mkdir(parents=True, exist_ok=True)
+
+        if _HAS_PANDAS:
+            up_to_date, excel_files = split_excel_files(excel_dir, csv_dir)
+            tasks = [(str(excel_file), str(csv_dir)) for excel_file in excel_files]
+            errors = [error for _, error in run_tasks_in_pool(_convert_one, tasks)]
+            return collect_conversions(up_to_date, excel_files, errors, skipped)
 
+        # 如果没有pandas，创建示例文件
+        converted = []
+        for entry in scan_files(excel_dir, ".xlsx"):
+            excel_file = Path(entry.path)
+            csv_file = csv_dir / f"{excel_file.stem}.csv"
+            with open(csv_file, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f)
+                # 创建符合规范的示例数据
+                headers = ['刷新时间', '保险起期', '业务类型分类', '签单保费(万)', '满期保费(万)',
+                          '赔案件数', '总赔款(万)', '费用率', '周次']
+                writer.writerow(headers)
+                writer.writerow(['2025-01-01', 2025, '机动车辆保险', 100.5, 95.2, 3, 45.8, 0.15, 1])
+            converted.append(excel_file.name)
         return converted
 
     class CarInsuranceDataRestructurer:
+        # 规范要求的25个输出字段（按顺序）
+        REQUIRED_FIELDS = (
+            # 筛选维度字段（1-17）
+            'snapshot_date', 'policy_start_year', 'business_type_category', 'chengdu_branch',
+            'third_level_organization', 'customer_category_3', 'insurance_type', 'is_new_energy_vehicle',
+            'coverage_type', 'is_transferred_vehicle', 'renewal_status', 'vehicle_insurance_grade',
+            'highway_risk_grade', 'large_truck_score', 'small_truck_score', 'terminal_source',
+            'week_number',
+            # 绝对值字段（18-25）
+            'signed_premium_yuan', 'matured_premium_yuan', 'policy_count', 'claim_case_count',
+            'reported_claim_payment_yuan', 'expense_amount_yuan', 'commercial_premium_before_discount_yuan',
+            'marginal_contribution_amount_yuan'
+        )
+        REQUIRED_FIELDS_SET = frozenset(REQUIRED_FIELDS)
+
         def __init__(self):
             self.field_mapping = FIELD_MAPPING
             self.processed_files = []
+            # 按年度分组的已处理文件信息，与 processed_files 同步维护
+            self._by_year = defaultdict(list)
             self.failed_files = []
             self.years_processed = set()
 
@@ -460,115 +931,69 @@ def create_mock_preprocessor():
 
         def standardize_field_names(self, df):
             """标准化字段名称 - 确保输出全为英文字段名且不重复"""
-            df_renamed = df.copy()
-
-            # 映射中文字段名到英文字段名
-            rename_map = {}
-            used_english_names = set()
-
-            for chinese_name, english_name in self.field_mapping.items():
-                if chinese_name in df.columns:
-                    # 检查英文名是否已被使用
-                    if english_name in used_english_names:
-                        # 如果重复，添加后缀
-                        counter = 1
-                        new_english_name = f"{english_name}_{counter}"
-                        while new_english_name in used_english_names:
-                            counter += 1
-                            new_english_name = f"{english_name}_{counter}"
-                        english_name = new_english_name
-
-                    rename_map[chinese_name] = english_name
-                    used_english_names.add(english_name)
-
-            # 执行重命名
-            df_renamed = df_renamed.rename(columns=rename_map)
-
-            # 检查并处理剩余的中文字段名
-            remaining_chinese_cols = [col for col in df_renamed.columns if self._contains_chinese(col)]
-            for col in remaining_chinese_cols:
-                # 为剩余的中文字段生成英文名
-                english_name = self._generate_english_name(col)
-                if english_name not in used_english_names:
-                    df_renamed = df_renamed.rename(columns={col: english_name})
-                    used_english_names.add(english_name)
+            # 映射中文字段名到英文字段名，FIELD_MAPPING 的英文名互不重复，无需处理冲突
+            rename_map = {col: self.field_mapping[col] for col in df.columns if col in self.field_mapping}
+            used_english_names = set(rename_map.values())
+
+            # 为剩余的中文字段生成英文名，与已使用的英文名重复时保留原名
+            for col in df.columns:
+                if col not in rename_map and self._contains_chinese(col):
+                    english_name = self._generate_english_name(col)
+                    if english_name not in used_english_names:
+                        rename_map[col] = english_name
+                        used_english_names.add(english_name)
+
+            # 一次完成全部重命名，rename 返回新的DataFrame，无需预先复制
+            df_renamed = df.rename(columns=rename_map)
 
             # 处理布尔值字段
             boolean_fields = ['is_new_energy_vehicle', 'is_transferred_vehicle']
             for field in boolean_fields:
                 if field in df_renamed.columns:
-                    df_renamed[field] = df_renamed[field].apply(standardize_boolean_value)
+                    df_renamed[field] = standardize_boolean_series(df_renamed[field])
 
             return df_renamed
 
         def _contains_chinese(self, text):
             """检查字符串是否包含中文"""
-            import re
-            return bool(re.search(r'[\u4e00-\u9fff]', str(text)))
+            return contains_chinese(str(text))
 
         def _generate_english_name(self, chinese_name):
             """为中文字段名生成英文名"""
-            # 简单的拼音映射或直接翻译
-            translation_map = {
-                '保费': 'premium',
-                '件数': 'count',
-                '金额': 'amount',
-                '数量': 'quantity',
-                '率': 'ratio',
-                '时间': 'time',
-                '日期': 'date',
-                '类型': 'type',
-                '状态': 'status'
-            }
-
-            english_name = chinese_name
-            for chinese, english in translation_map.items():
-                english_name = english_name.replace(chinese, english)
-
-            # 移除特殊字符，使用下划线连接
-            english_name = re.sub(r'[^a-zA-Z0-9\u4e00-\u9fff]', '_', english_name)
-            english_name = english_name.lower().strip('_')
+            return generate_english_name(chinese_name)
 
-            # 如果仍然包含中文，使用通用名称
-            if self._contains_chinese(english_name):
-                english_name = f"field_{len(english_name)}"
-
-            return english_name
-
-        def extract_year_and_week(self, df, filename):
-            """提取年度和周次信息"""
+        def extract_year_and_week(self, df, filename, now=None):
+            """提取年度和周次信息，now 为本次处理的统一时间（缺省时取当前时间）"""
             # 优先从数据中提取保险起期年度
             year = None
             week = None
 
             # 1. 从数据中提取年度（优先级最高）
             if 'policy_start_year' in df.columns and not df['policy_start_year'].empty:
-                year_series = pd.to_numeric(df['policy_start_year'], errors='coerce').dropna()
-                if not year_series.empty:
-                    year = int(year_series.mode().iloc[0])
+                year = most_common_int(df['policy_start_year'])
 
             # 2. 如果数据中没有，从文件名提取
             if year is None:
-                year_match = re.search(r'(\d{4})', filename)
+                year_match = _YEAR_RE.search(filename)
                 if year_match:
                     year = int(year_match.group(1))
                 else:
-                    year = datetime.now().year
+                    now = now or datetime.now()
+                    year = now.year
 
             # 3. 提取周次信息
             if 'week_number' in df.columns and not df['week_number'].empty:
-                week_series = pd.to_numeric(df['week_number'], errors='coerce').dropna()
-                if not week_series.empty:
-                    week = int(week_series.mode().iloc[0])
+                week = most_common_int(df['week_number'])
 
             # 4. 如果数据中没有，从文件名提取
             if week is None:
-                week_match = re.search(r'第(\d+)周', filename)
+                week_match = _WEEK_RE.search(filename)
                 if week_match:
                     week = int(week_match.group(1))
                 else:
                     # 根据当前日期计算周次
-                    week = datetime.now().isocalendar()[1]
+                    now = now or datetime.now()
+                    week = now.isocalendar()[1]
 
             return year, week
 
@@ -577,27 +1002,11 @@ def create_mock_preprocessor():
             最终字段筛选和排序 - 确保输出严格按照25字段规范
             17个筛选维度字段 + 8个绝对值字段 = 25个字段
             """
-            # 定义规范要求的25个字段（按顺序）
-            required_fields = [
-                # 筛选维度字段（1-17）
-                'snapshot_date', 'policy_start_year', 'business_type_category', 'chengdu_branch',
-                'third_level_organization', 'customer_category_3', 'insurance_type', 'is_new_energy_vehicle',
-                'coverage_type', 'is_transferred_vehicle', 'renewal_status', 'vehicle_insurance_grade',
-                'highway_risk_grade', 'large_truck_score', 'small_truck_score', 'terminal_source',
-                'week_number',
-                # 绝对值字段（18-25）
-                'signed_premium_yuan', 'matured_premium_yuan', 'policy_count', 'claim_case_count',
-                'reported_claim_payment_yuan', 'expense_amount_yuan', 'commercial_premium_before_discount_yuan',
-                'marginal_contribution_amount_yuan'
-            ]
+            # 一次reindex按规范顺序取出字段，缺失字段再按类型补默认值
+            result_df = df.reindex(columns=self.REQUIRED_FIELDS)
             
-            # 创建新的DataFrame，只包含规范要求的字段
-            result_df = pd.DataFrame()
-            
-            for field in required_fields:
-                if field in df.columns:
-                    result_df[field] = df[field]
-                else:
+            for field in self.REQUIRED_FIELDS:
+                if field not in df.columns:
                     # 如果字段缺失，根据字段类型设置默认值
                     if field in ['policy_count', 'claim_case_count']:
                         result_df[field] = 0  # 整数字段默认为0
@@ -623,33 +1032,23 @@ def create_mock_preprocessor():
             if actual_field_count != expected_field_count:
                 issues.append(f"字段数量不符: 期望{expected_field_count}个，实际{actual_field_count}个")
             
-            # 检查必需字段
-            required_fields = [
-                # 筛选维度字段（1-17）
-                'snapshot_date', 'policy_start_year', 'business_type_category', 'chengdu_branch',
-                'third_level_organization', 'customer_category_3', 'insurance_type', 'is_new_energy_vehicle',
-                'coverage_type', 'is_transferred_vehicle', 'renewal_status', 'vehicle_insurance_grade',
-                'highway_risk_grade', 'large_truck_score', 'small_truck_score', 'terminal_source',
-                'week_number',
-                # 绝对值字段（18-25）
-                'signed_premium_yuan', 'matured_premium_yuan', 'policy_count', 'claim_case_count',
-                'reported_claim_payment_yuan', 'expense_amount_yuan', 'commercial_premium_before_discount_yuan',
-                'marginal_contribution_amount_yuan'
-            ]
-            
-            missing_fields = [field for field in required_fields if field not in df.columns]
-            if missing_fields:
-                issues.append(f"缺少必需字段: {', '.join(missing_fields)}")
-            
-            extra_fields = [field for field in df.columns if field not in required_fields]
-            if extra_fields:
-                issues.append(f"包含额外字段: {', '.join(extra_fields)}")
-            
-            # 检查字段顺序
-            actual_fields = list(df.columns)
-            for i, expected_field in enumerate(required_fields):
-                if i < len(actual_fields) and actual_fields[i] != expected_field:
-                    issues.append(f"字段顺序错误: 位置{i+1}期望'{expected_field}'，实际'{actual_fields[i] if i < len(actual_fields) else '缺失'}'")
+            # 字段与顺序完全一致时无需逐项检查
+            actual_fields = tuple(df.columns)
+            if actual_fields != self.REQUIRED_FIELDS:
+                # 检查必需字段
+                actual_set = set(actual_fields)
+                missing_fields = [field for field in self.REQUIRED_FIELDS if field not in actual_set]
+                if missing_fields:
+                    issues.append(f"缺少必需字段: {', '.join(missing_fields)}")
+                
+                extra_fields = [field for field in actual_fields if field not in self.REQUIRED_FIELDS_SET]
+                if extra_fields:
+                    issues.append(f"包含额外字段: {', '.join(extra_fields)}")
+                
+                # 检查字段顺序
+                for i, expected_field in enumerate(self.REQUIRED_FIELDS):
+                    if i < len(actual_fields) and actual_fields[i] != expected_field:
+                        issues.append(f"字段顺序错误: 位置{i+1}期望'{expected_field}'，实际'{actual_fields[i]}'")
             
             is_compliant = len(issues) == 0
             
@@ -660,85 +1059,142 @@ def create_mock_preprocessor():
             
             return is_compliant, issues
 
-        def process_all_files(self, csv_dir, output_dir):
-            """按规范处理所有CSV文件，集成增强的错误处理"""
-            from pathlib import Path
-            csv_dir = Path(csv_dir)
-            output_dir = Path(output_dir)
-            output_dir.mkdir(parents=True, exist_ok=True)
+        def read_source_csv(self, csv_file):
+            """
+            读取待处理的CSV，固定使用 pandas 默认的 C 解析器
+            pyarrow 解析器会把日期和数字样式的文本推断为时间戳/数值，输出会随是否安装 pyarrow 而变化
+            """
+            return pd.read_csv(csv_file, encoding='utf-8-sig')
 
-            # 创建元数据目录
-            metadata_dir = output_dir / "metadata"
-            metadata_dir.mkdir(exist_ok=True)
+        def process_csv_file(self, csv_file, output_dir, now=None):
+            """
+            处理单个CSV文件并写出结果，不修改实例状态以便在子进程中执行
+            返回包含处理状态的字典，错误记录由调用方统一完成
+            """
+            logger.info(f"正在处理文件: {csv_file.name}")
 
-            logger.info(f"开始处理CSV文件，输入目录: {csv_dir}, 输出目录: {output_dir}")
+            # 读取CSV文件
+            df = self.read_source_csv(csv_file)
 
-            for csv_file in csv_dir.glob("*.csv"):
-                try:
-                    logger.info(f"正在处理文件: {csv_file.name}")
-                    
-                    # 读取CSV文件
-                    df = pd.read_csv(csv_file, encoding='utf-8-sig')
-
-                    if df.empty:
-                        error_msg = "文件为空"
-                        error_handler.log_error("文件读取", error_msg, {"file": csv_file.name})
-                        self.failed_files.append({"file": csv_file.name, "error": error_msg})
-                        continue
+            if df.empty:
+                return {"status": "empty"}
+
+            # 数据质量检查
+            quality_issues = self.validate_data_quality(df)
+            quality_warnings = list(quality_issues)
+
+            # 先计算8个绝对值字段（基于原始中文字段）- 严格按照处理规范.md要求
+            df_with_calculations = calculate_absolute_fields(df)
 
-                    # 数据质量检查
-                    quality_issues = self.validate_data_quality(df)
-                    if quality_issues:
-                        error_handler.log_warning("数据质量检查", f"发现质量问题: {quality_issues}", 
-                                                {"file": csv_file.name, "issues": quality_issues})
+            # 再标准化字段名（包括新计算的字段）
+            df_standardized = self.standardize_field_names(df_with_calculations)
 
-                    # 先计算8个绝对值字段（基于原始中文字段）- 严格按照处理规范.md要求
-                    df_with_calculations = calculate_absolute_fields(df)
+            # 提取年度和周次
+            year, week = self.extract_year_and_week(df_standardized, csv_file.name, now)
 
-                    # 再标准化字段名（包括新计算的字段）
-                    df_standardized = self.standardize_field_names(df_with_calculations)
+            # 确保周次字段存在
+            if 'week_number' not in df_standardized.columns:
+                df_standardized['week_number'] = week
 
-                    # 提取年度和周次
-                    year, week = self.extract_year_and_week(df_standardized, csv_file.name)
-                    self.years_processed.add(year)
+            # 最终字段筛选和排序 - 确保输出严格按照25字段规范
+            df_final = self.finalize_output_fields(df_standardized)
 
-                    # 确保周次字段存在
-                    if 'week_number' not in df_standardized.columns:
-                        df_standardized['week_number'] = week
+            # 按规范命名输出文件
+            output_filename = f"{year}保单第{week:02d}周变动成本明细表.csv"
+            output_file = output_dir / output_filename
 
-                    # 最终字段筛选和排序 - 确保输出严格按照25字段规范
-                    df_final = self.finalize_output_fields(df_standardized)
+            # 验证输出是否符合规范
+            is_compliant, validation_issues = self.validate_output_compliance(df_final, output_filename)
+            if not is_compliant:
+                quality_issues.extend(validation_issues)
 
-                    # 按规范命名输出文件
-                    output_filename = f"{year}保单第{week:02d}周变动成本明细表.csv"
-                    output_file = output_dir / output_filename
+            # 保存处理后的数据，分块写出以限制格式化时的内存占用
+            # 先写临时文件再原子替换，下载时不会读到写了一半的文件，目录 mtime 也随之更新
+            tmp_file = output_file.with_name(f"{output_filename}.{os.getpid()}.part")
+            try:
+                df_final.to_csv(tmp_file, index=False, encoding='utf-8-sig', lineterminator='\n',
+                                chunksize=CSV_WRITE_BATCH_SIZE)
+                os.replace(tmp_file, output_file)
+            except BaseException:
+                tmp_file.unlink(missing_ok=True)
+                raise
+
+            logger.info(f"文件处理成功: {csv_file.name} -> {output_filename} ({len(df_final)} 条记录, {len(df_final.columns)} 个字段)")
+
+            file_info = {
+                "source_file": csv_file.name,
+                "output_file": output_filename,
+                "year": int(year),
+                "week": int(week),
+                "records_count": int(len(df_final)),
+                "quality_issues": quality_issues
+            }
 
-                    # 验证输出是否符合规范
-                    is_compliant, validation_issues = self.validate_output_compliance(df_final, output_filename)
-                    if not is_compliant:
-                        quality_issues.extend(validation_issues)
+            if OUTPUT_PARQUET and pyarrow is not None:
+                # Parquet 为附加输出，写入失败（如混合类型列）不影响CSV结果
+                parquet_file = output_file.with_suffix('.parquet')
+                try:
+                    df_final.to_parquet(parquet_file, engine='pyarrow', compression='zstd', index=False)
+                    file_info["parquet_file"] = parquet_file.name
+                except Exception as exc:
+                    parquet_file.unlink(missing_ok=True)
+                    logger.warning(f"Parquet 输出失败: {output_filename}: {exc}")
 
-                    # 保存处理后的数据
-                    df_final.to_csv(output_file, index=False, encoding='utf-8-sig')
+            return {
+                "status": "ok",
+                "quality_warnings": quality_warnings,
+                "file_info": file_info
+            }
 
-                    self.processed_files.append({
-                        "source_file": csv_file.name,
-                        "output_file": output_filename,
-                        "year": int(year),
-                        "week": int(week),
-                        "records_count": int(len(df_final)),
-                        "quality_issues": quality_issues
-                    })
-                    
-                    logger.info(f"文件处理成功: {csv_file.name} -> {output_filename} ({len(df_final)} 条记录, {len(df_final.columns)} 个字段)")
+        def process_all_files(self, csv_dir, output_dir):
+            """按规范处理所有CSV文件，多个文件时并行处理，集成增强的错误处理"""
+            csv_dir = Path(csv_dir)
+            output_dir = self.prepare_output_dir(output_dir)
 
-                except Exception as e:
-                    error_msg = f"处理失败: {str(e)}"
-                    error_handler.log_error("文件处理", e, {
+            logger.info(f"开始处理CSV文件，输入目录: {csv_dir}, 输出目录: {output_dir}")
+
+            # 本次处理的统一时间，避免每个文件各自取当前时间
+            now = datetime.now()
+            csv_files = [Path(entry.path) for entry in scan_files(csv_dir, ".csv")]
+            tasks = [(str(csv_file), str(output_dir), now) for csv_file in csv_files]
+            return self.collect_outcomes(csv_files, run_tasks_in_pool(_process_one_csv, tasks), output_dir)
+
+        @staticmethod
+        def prepare_output_dir(output_dir):
+            """创建输出目录及其元数据目录"""
+            output_dir = Path(output_dir)
+            output_dir.mkdir(parents=True, exist_ok=True)
+            (output_dir / "metadata").mkdir(exist_ok=True)
+            return output_dir
+
+        def collect_outcomes(self, csv_files, outcomes, output_dir):
+            """汇总各CSV文件的处理结果（与 csv_files 一一对应），记录错误并生成处理报告"""
+            output_dir = Path(output_dir)
+            for csv_file, outcome in zip(csv_files, outcomes):
+                if outcome["status"] == "empty":
+                    error_msg = "文件为空"
+                    error_handler.log_error("文件读取", error_msg, {"file": csv_file.name})
+                    self.failed_files.append({"file": csv_file.name, "error": error_msg})
+                    continue
+
+                if outcome["status"] == "error":
+                    error_msg = f"处理失败: {outcome['error']}"
+                    error_handler.log_error("文件处理", outcome["error"], {
                         "file": csv_file.name,
-                        "traceback": traceback.format_exc()
+                        "error_type": outcome["error_type"],
+                        "traceback": outcome["traceback"]
                     })
                     self.failed_files.append({"file": str(csv_file.name), "error": str(error_msg)})
+                    continue
+
+                if outcome["quality_warnings"]:
+                    error_handler.log_warning("数据质量检查", f"发现质量问题: {outcome['quality_warnings']}",
+                                            {"file": csv_file.name, "issues": outcome["quality_warnings"]})
+
+                file_info = outcome["file_info"]
+                self.years_processed.add(file_info["year"])
+                self.processed_files.append(file_info)
+                self._by_year[file_info["year"]].append(file_info)
 
             # 生成处理报告
             self._generate_processing_report(output_dir)
@@ -747,10 +1203,10 @@ def create_mock_preprocessor():
             error_handler.save_error_report(output_dir)
 
             processing_summary = {
-                "total_files": int(len(self.processed_files) + len(self.failed_files)),
-                "successful": int(len(self.processed_files)),
-                "failed": int(len(self.failed_files)),
-                "years_processed": [int(year) for year in sorted(list(self.years_processed))]
+                "total_files": len(self.processed_files) + len(self.failed_files),
+                "successful": len(self.processed_files),
+                "failed": len(self.failed_files),
+                "years_processed": sorted(self.years_processed)
             }
             
             logger.info(f"处理完成: {processing_summary}")
@@ -762,10 +1218,10 @@ def create_mock_preprocessor():
             report = {
                 "timestamp": datetime.now().isoformat(),
                 "processing_summary": {
-                    "total_files": int(len(self.processed_files) + len(self.failed_files)),
-                    "successful": int(len(self.processed_files)),
-                    "failed": int(len(self.failed_files)),
-                    "years_processed": [int(year) for year in sorted(list(self.years_processed))]
+                    "total_files": len(self.processed_files) + len(self.failed_files),
+                    "successful": len(self.processed_files),
+                    "failed": len(self.failed_files),
+                    "years_processed": sorted(self.years_processed)
                 },
                 "processed_files": self.processed_files,
                 "failed_files": self.failed_files,
@@ -774,98 +1230,95 @@ def create_mock_preprocessor():
             }
 
             report_file = output_dir / "data_restructure_report.json"
-            with open(report_file, 'w', encoding='utf-8') as f:
-                json.dump(report, f, ensure_ascii=False, indent=2, cls=NumpyEncoder)
+            dump_json(report, report_file, pretty=False)
 
         def _calculate_year_statistics(self):
             """计算按年度分类的统计信息"""
-            year_stats = {}
-            for file_info in self.processed_files:
-                year = file_info['year']
-                if year not in year_stats:
-                    year_stats[year] = {'files': 0, 'total_records': 0, 'weeks': set()}
-                year_stats[year]['files'] += 1
-                year_stats[year]['total_records'] += file_info['records_count']
-                year_stats[year]['weeks'].add(file_info['week'])
-
-            # 转换set为list
-            for year in year_stats:
-                year_stats[year]['weeks'] = sorted(list(year_stats[year]['weeks']))
-
-            return year_stats
+            return {
+                year: {
+                    'files': len(files),
+                    'total_records': sum(f['records_count'] for f in files),
+                    'weeks': sorted({f['week'] for f in files})
+                }
+                for year, files in self._by_year.items()
+            }
 
     class DataStructureManager:
         def __init__(self, output_dir):
-            from pathlib import Path
             self.output_dir = Path(output_dir)
             self.metadata_dir = self.output_dir / "metadata"
             self.metadata_dir.mkdir(exist_ok=True)
 
         def update_metadata(self):
             """更新符合规范的元数据信息"""
-            # 1. 生成available_years.json
-            self._generate_available_years()
-
-            # 2. 生成available_weeks.json
-            self._generate_available_weeks()
-
-            # 3. 生成data_catalog.json
-            self._generate_data_catalog()
+            # 单次扫描输出目录，各元数据文件共用同一份文件索引
+            self._build_file_index()
+            # 各元数据文件共用同一个更新时间
+            now = datetime.now().isoformat()
+
+            # 1-3. available_years.json / available_weeks.json / data_catalog.json 互不依赖，
+            # 文件索引建立后只读，三者并发写出
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                futures = [
+                    executor.submit(self._generate_available_years, now),
+                    executor.submit(self._generate_available_weeks, now),
+                    executor.submit(self._generate_data_catalog, now),
+                ]
+                for future in futures:
+                    future.result()
 
             # 4. 生成主元数据文件
-            return self._generate_main_metadata()
+            return self._generate_main_metadata(now)
 
-        def _generate_available_years(self):
+        def _generate_available_years(self, now):
             """生成可用年度信息"""
-            years_data = self._extract_years_from_files()
+            years_data = self._file_index["years_data"]
             available_years = {
-                "last_updated": datetime.now().isoformat(),
+                "last_updated": now,
                 "available_years": sorted(years_data.keys()),
                 "year_details": {}
             }
 
             for year, files in years_data.items():
                 available_years["year_details"][str(year)] = {
-                    "files_count": int(len(files)),
-                    "weeks_available": [int(f["week"]) for f in files],
+                    "files_count": len(files),
+                    "weeks_available": [f["week"] for f in files],
                     "files": files
                 }
 
             years_file = self.metadata_dir / "available_years.json"
-            with open(years_file, 'w', encoding='utf-8') as f:
-                json.dump(available_years, f, ensure_ascii=False, indent=2, cls=NumpyEncoder)
+            dump_json(available_years, years_file)
 
-        def _generate_available_weeks(self):
+        def _generate_available_weeks(self, now):
             """生成年度-周次映射关系"""
-            years_data = self._extract_years_from_files()
+            years_data = self._file_index["years_data"]
             weeks_mapping = {
-                "last_updated": datetime.now().isoformat(),
+                "last_updated": now,
                 "year_week_mapping": {},
                 "total_weeks": 0
             }
 
             total_weeks = 0
             for year, files in years_data.items():
-                weeks = sorted(set([f["week"] for f in files]))
+                weeks = sorted({f["week"] for f in files})
                 weeks_mapping["year_week_mapping"][str(year)] = {
-                    "available_weeks": [int(w) for w in weeks],
-                    "weeks_count": int(len(weeks)),
-                    "missing_weeks": [int(w) for w in self._find_missing_weeks(weeks)]
+                    "available_weeks": weeks,
+                    "weeks_count": len(weeks),
+                    "missing_weeks": self._find_missing_weeks(weeks)
                 }
                 total_weeks += len(weeks)
 
             weeks_mapping["total_weeks"] = total_weeks
 
             weeks_file = self.metadata_dir / "available_weeks.json"
-            with open(weeks_file, 'w', encoding='utf-8') as f:
-                json.dump(weeks_mapping, f, ensure_ascii=False, indent=2, cls=NumpyEncoder)
+            dump_json(weeks_mapping, weeks_file)
 
-        def _generate_data_catalog(self):
+        def _generate_data_catalog(self, now):
             """生成数据目录概览"""
-            csv_files = list(self.output_dir.glob("*保单第*周变动成本明细表.csv"))
+            csv_files = self._file_index["data_files"]
 
             catalog = {
-                "last_updated": datetime.now().isoformat(),
+                "last_updated": now,
                 "total_files": len(csv_files),
                 "data_structure": {
                     "filtering_dimensions": 17,
@@ -873,33 +1326,35 @@ def create_mock_preprocessor():
                     "field_mapping": FIELD_MAPPING
                 },
                 "files_catalog": [],
-                "data_quality_summary": self._analyze_data_quality(csv_files)
+                "data_quality_summary": self._analyze_data_quality(csv_files, now)
             }
 
-            for csv_file in csv_files:
-                file_info = self._analyze_csv_file(csv_file)
+            for csv_file, _, _, stat in csv_files:
+                file_info = self._analyze_csv_file(csv_file, stat)
                 catalog["files_catalog"].append(file_info)
 
             catalog_file = self.metadata_dir / "data_catalog.json"
-            with open(catalog_file, 'w', encoding='utf-8') as f:
-                json.dump(catalog, f, ensure_ascii=False, indent=2, cls=NumpyEncoder)
+            dump_json(catalog, catalog_file, pretty=False)
 
-        def _generate_main_metadata(self):
+        def _generate_main_metadata(self, now):
             """生成主元数据文件"""
-            csv_files = list(self.output_dir.glob("*.csv"))
+            total_files, main_data_files, metadata_files = self._file_index["csv_counts"]
+
             metadata = {
-                "last_updated": datetime.now().isoformat(),
+                "last_updated": now,
                 "data_directory": str(self.output_dir),
                 "structure_info": "17个筛选维度 + 9个绝对值字段 + 实时计算机制",
                 "files_summary": {
-                    "total_files": len(csv_files),
-                    "main_data_files": len([f for f in csv_files if "保单" in f.name]),
-                    "metadata_files": len([f for f in csv_files if "metadata" in f.name or "report" in f.name])
+                    "total_files": total_files,
+                    "main_data_files": main_data_files,
+                    "metadata_files": metadata_files
                 },
                 "data_format": {
                     "encoding": "UTF-8 with BOM",
                     "separator": ",",
-                    "naming_convention": "YYYY保单第WW周变动成本明细表.csv"
+                    "naming_convention": "YYYY保单第WW周变动成本明细表.csv",
+                    # 条目随文件数增长的 JSON 以紧凑格式写出，其余元数据保持缩进便于阅读
+                    "compact_json_files": ["data_restructure_report.json", "metadata/data_catalog.json"]
                 },
                 "absolute_value_fields": [
                     "signed_premium_yuan", "matured_premium_yuan", "commercial_premium_before_discount_yuan",
@@ -912,71 +1367,124 @@ def create_mock_preprocessor():
             }
 
             metadata_file = self.output_dir / "metadata.json"
-            with open(metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2, cls=NumpyEncoder)
+            dump_json(metadata, metadata_file)
 
             return metadata
 
-        def _extract_years_from_files(self):
-            """从文件名提取年度和周次信息"""
-            years_data = {}
-            csv_files = list(self.output_dir.glob("*保单第*周变动成本明细表.csv"))
+        def _build_file_index(self):
+            """
+            单次 scandir 建立输出目录的文件索引：
+            data_files 为符合命名规范的数据文件 (路径, 年度, 周次, stat)，年度/周次无法解析时为 None；
+            csv_counts 为 (CSV总数, 主数据文件数, 元数据/报告文件数)；
+            years_data 为按年度整理的周次文件信息
+            目录 mtime 未变化时直接复用上次的索引
+            """
+            key = str(self.output_dir)
+            dir_mtime = os.stat(self.output_dir).st_mtime_ns
+            cached = _FILE_INDEX_CACHE.get(key)
+            if cached is not None and cached[0] == dir_mtime:
+                self._file_index = cached[1]
+                return self._file_index
+
+            data_files = []
+            total_files = main_data_files = metadata_files = 0
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if not name.endswith(".csv"):
+                        continue
+                    total_files += 1
+                    if "保单" in name:
+                        main_data_files += 1
+                    if "metadata" in name or "report" in name:
+                        metadata_files += 1
+
+                    # 规范命名的文件一次匹配取出年度和周次；其余仍按 Path.glob 规则收入目录，但不计入年度/周次
+                    name_match = _WEEK_FILE_RE.fullmatch(name)
+                    if name_match is None and not fnmatch.fnmatchcase(name, "*保单第*周变动成本明细表.csv"):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        stat = None
+                    data_files.append((
+                        Path(entry.path),
+                        int(name_match.group(1)) if name_match else None,
+                        int(name_match.group(2)) if name_match else None,
+                        stat,
+                    ))
+
+            self._file_index = {
+                "data_files": data_files,
+                "csv_counts": (total_files, main_data_files, metadata_files),
+            }
+            # 年度分组只整理一次，年度和周次两个元数据文件共用
+            self._file_index["years_data"] = self._extract_years_from_files()
 
-            for csv_file in csv_files:
-                # 从文件名提取年度和周次
-                year_match = re.search(r'(\d{4})保单', csv_file.name)
-                week_match = re.search(r'第(\d+)周', csv_file.name)
+            if time.time_ns() - dir_mtime > _FILE_INDEX_RACY_NS:
+                if len(_FILE_INDEX_CACHE) >= _FILE_INDEX_CACHE_MAXSIZE:
+                    _FILE_INDEX_CACHE.pop(next(iter(_FILE_INDEX_CACHE)), None)
+                _FILE_INDEX_CACHE[key] = (dir_mtime, self._file_index)
+            return self._file_index
 
-                if year_match and week_match:
-                    year = int(year_match.group(1))
-                    week = int(week_match.group(1))
+        def _extract_years_from_files(self):
+            """从文件索引中按年度整理周次文件信息"""
+            years_data = {}
+            for csv_file, year, week, stat in self._file_index["data_files"]:
+                if year is None or week is None or stat is None:
+                    continue
 
-                    if year not in years_data:
-                        years_data[year] = []
+                if year not in years_data:
+                    years_data[year] = []
 
-                    years_data[year].append({
-                        "filename": csv_file.name,
-                        "week": week,
-                        "file_size": csv_file.stat().st_size,
-                        "modified_time": datetime.fromtimestamp(csv_file.stat().st_mtime).isoformat()
-                    })
+                years_data[year].append({
+                    "filename": csv_file.name,
+                    "week": week,
+                    "file_size": stat.st_size,
+                    "modified_time": datetime.fromtimestamp(stat.st_mtime).isoformat()
+                })
 
             return years_data
 
         def _find_missing_weeks(self, available_weeks):
-            """查找缺失的周次"""
+            """查找缺失的周次：对有序周次线性扫描相邻间隔"""
             if not available_weeks:
                 return list(range(1, 53))
 
-            min_week, max_week = min(available_weeks), max(available_weeks)
-            all_weeks = set(range(min_week, max_week + 1))
-            available_set = set(available_weeks)
-            return sorted(list(all_weeks - available_set))
-
-        def _analyze_csv_file(self, csv_file):
-            """分析CSV文件的详细信息"""
-            try:
-                # 在云端环境中的简化分析
-                file_size = csv_file.stat().st_size
-                return {
-                    "filename": csv_file.name,
-                    "full_path": str(csv_file),
-                    "file_size_bytes": file_size,
-                    "file_size_mb": round(file_size / 1024 / 1024, 2),
-                    "modified_time": datetime.fromtimestamp(csv_file.stat().st_mtime).isoformat(),
-                    "status": "available"
-                }
-            except Exception as e:
+            missing = []
+            weeks = iter(sorted(available_weeks))
+            previous = next(weeks)
+            for week in weeks:
+                if week > previous + 1:
+                    missing.extend(range(previous + 1, week))
+                previous = week
+            return missing
+
+        def _analyze_csv_file(self, csv_file, stat):
+            """分析CSV文件的详细信息，stat 取自文件索引"""
+            if stat is None:
                 return {
                     "filename": csv_file.name,
-                    "error": f"文件分析失败: {str(e)}",
+                    "error": "文件分析失败: 无法读取文件状态",
                     "status": "error"
                 }
+            # 在云端环境中的简化分析
+            file_size = stat.st_size
+            return {
+                "filename": csv_file.name,
+                "full_path": str(csv_file),
+                "file_size_bytes": file_size,
+                "file_size_mb": round(file_size / 1024 / 1024, 2),
+                "modified_time": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                "status": "available"
+            }
 
-        def _analyze_data_quality(self, csv_files):
-            """分析数据质量概况"""
+        def _analyze_data_quality(self, csv_files, now):
+            """分析数据质量概况，csv_files 为文件索引中的数据文件"""
             total_files = len(csv_files)
-            total_size = sum(f.stat().st_size for f in csv_files if f.exists())
+            total_size = sum(stat.st_size for _, _, _, stat in csv_files if stat is not None)
 
             return {
                 "total_files_analyzed": total_files,
@@ -984,57 +1492,297 @@ def create_mock_preprocessor():
                 "average_file_size_mb": round(total_size / 1024 / 1024 / max(total_files, 1), 2),
                 "data_completeness": "95%",
                 "quality_score": "A",
-                "last_quality_check": datetime.now().isoformat()
+                "last_quality_check": now
             }
 
     # 将函数和类添加到模块
     module.convert_excel_to_csv = convert_excel_to_csv
+    module.convert_excel_file = convert_excel_file
+    module.split_excel_files = split_excel_files
+    module.collect_conversions = collect_conversions
+    module.scan_files = scan_files
     module.CarInsuranceDataRestructurer = CarInsuranceDataRestructurer
     module.DataStructureManager = DataStructureManager
     module.calculate_absolute_fields = calculate_absolute_fields
     module.standardize_boolean_value = standardize_boolean_value
+    module.standardize_boolean_series = standardize_boolean_series
+    module.most_common_int = most_common_int
     module.FIELD_MAPPING = FIELD_MAPPING
     module.BOOLEAN_VALUE_MAP = BOOLEAN_VALUE_MAP
 
     return module
 
 
+def run_tasks_in_pool(func, tasks):
+    """
+    多个任务时使用进程池并行执行，单个任务或运行环境不支持多进程时串行执行
+    func 必须是模块级函数（可被pickle），且自行捕获业务异常
+    """
+    if len(tasks) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(len(tasks), os.cpu_count() or 1)) as executor:
+                return list(executor.map(func, tasks, chunksize=1))
+        except (OSError, NotImplementedError, BrokenProcessPool) as exc:
+            # 部分serverless环境（如AWS Lambda）不支持多进程所需的共享内存
+            logger.warning(f"进程池不可用，改为串行执行: {exc}")
+    return [func(task) for task in tasks]
+
+
+def _convert_one(task):
+    """进程池任务：转换单个Excel文件，返回 (写出的CSV路径列表, 错误信息)，成功时错误信息为None"""
+    excel_path, csv_dir = task
+    try:
+        written = load_preprocessor_module().convert_excel_file(Path(excel_path), Path(csv_dir))
+        return [str(path) for path in written], None
+    except Exception as exc:
+        return [], str(exc)
+
+
+def _process_one_csv(task):
+    """进程池任务：按规范处理单个CSV文件，异常转换为可pickle的结果字典"""
+    csv_path, output_dir, now = task
+    try:
+        restructurer = load_preprocessor_module().CarInsuranceDataRestructurer()
+        return restructurer.process_csv_file(Path(csv_path), Path(output_dir), now)
+    except Exception as exc:
+        return {
+            "status": "error",
+            "error": str(exc),
+            "error_type": type(exc).__name__,
+            "traceback": traceback.format_exc()
+        }
+
+
+def run_pipeline(module, excel_dir, csv_dir, output_dir, skipped=None):
+    """
+    Excel→CSV 转换与 CSV 预处理流水线执行，返回 (转换的文件名列表, 预处理结果)
+    两个阶段共用一个进程池：某个 Excel 转换完成即提交其 CSV 的预处理任务，无关的 CSV 一开始就提交；
+    处理的文件集合、结果顺序与先转换再预处理的串行流程一致
+    """
+    excel_dir = Path(excel_dir)
+    csv_dir = Path(csv_dir)
+    restructurer = module.CarInsuranceDataRestructurer()
+
+    def run_sequential():
+        converted = module.convert_excel_to_csv(excel_dir, csv_dir, skipped=skipped)
+        return converted, restructurer.process_all_files(str(csv_dir), str(output_dir))
+
+    if not _HAS_PANDAS:
+        return run_sequential()
+
+    csv_dir.mkdir(parents=True, exist_ok=True)
+    up_to_date, excel_files = module.split_excel_files(excel_dir, csv_dir)
+    # 待转换 Excel 的输出（含多 sheet 的 "<stem>_<sheet>.csv"）可能被覆盖，转换完成后再处理，其余 CSV 可立即处理
+    pending_prefixes = tuple(f"{excel_file.stem}_" for excel_file in excel_files)
+    pending_names = {f"{excel_file.stem}.csv" for excel_file in excel_files}
+    ready_csv_files = [
+        entry.path for entry in module.scan_files(csv_dir, ".csv")
+        if entry.name not in pending_names and not entry.name.startswith(pending_prefixes)
+    ]
+    if not excel_files or len(excel_files) + len(ready_csv_files) < 2:
+        # 没有可重叠的任务，不必启动进程池
+        return run_sequential()
+
+    output_dir = restructurer.prepare_output_dir(output_dir)
+    logger.info(f"流水线处理：待转换 {len(excel_files)} 个 Excel，输出目录: {output_dir}")
+    now = datetime.now()
+
+    try:
+        with ProcessPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+            csv_futures = {}
+
+            def submit_csv(csv_path):
+                name = os.path.basename(csv_path)
+                if name not in csv_futures:
+                    csv_futures[name] = (Path(csv_path), executor.submit(
+                        _process_one_csv, (str(csv_path), str(output_dir), now)))
+
+            for csv_path in ready_csv_files:
+                submit_csv(csv_path)
+
+            convert_futures = {
+                executor.submit(_convert_one, (str(excel_file), str(csv_dir))): excel_file
+                for excel_file in excel_files
+            }
+            convert_errors = {}
+            for future in as_completed(convert_futures):
+                written, error = future.result()
+                convert_errors[convert_futures[future]] = error
+                for csv_path in written:
+                    submit_csv(csv_path)
+
+            # 转换全部完成后补交剩余的 CSV（如转换失败或旧 sheet 的输出）
+            for entry in module.scan_files(csv_dir, ".csv"):
+                submit_csv(entry.path)
+
+            names = sorted(csv_futures)
+            csv_files = [csv_futures[name][0] for name in names]
+            outcomes = [csv_futures[name][1].result() for name in names]
+    except (OSError, NotImplementedError, BrokenProcessPool) as exc:
+        # 部分serverless环境（如AWS Lambda）不支持多进程所需的共享内存
+        logger.warning(f"进程池不可用，改为串行执行: {exc}")
+        return run_sequential()
+
+    errors = [convert_errors[excel_file] for excel_file in excel_files]
+    converted = module.collect_conversions(up_to_date, excel_files, errors, skipped)
+    return converted, restructurer.collect_outcomes(csv_files, outcomes, output_dir)
+
+
+# /scan 目录列表缓存：(目录, 后缀, 上限) -> (缓存时间, 文件名列表, 是否截断)
+DIR_CACHE_TTL = 5
+DIR_CACHE_MAXSIZE = 64
+SCAN_LIST_LIMIT = 500
+_dir_cache: Dict[tuple, tuple] = {}
+
+
+def list_dir(path, suffix, limit=SCAN_LIST_LIMIT):
+    """
+    列出目录下指定后缀的文件名，按名称取前 limit 个，结果缓存 DIR_CACHE_TTL 秒
+    返回 (文件名列表, 是否被截断)
+    """
+    key = (str(path), suffix, limit)
+    now = time.monotonic()
+    cached = _dir_cache.get(key)
+    if cached and now - cached[0] < DIR_CACHE_TTL:
+        return list(cached[1]), cached[2]
+
+    with os.scandir(path) as entries:
+        # 多取一个用于判断是否截断，避免对整个目录排序
+        names = heapq.nsmallest(limit + 1, (
+            e.name for e in entries
+            if e.name.endswith(suffix) and not e.name.startswith('.') and e.is_file()
+        ))
+    truncated = len(names) > limit
+    names = names[:limit]
+
+    if len(_dir_cache) >= DIR_CACHE_MAXSIZE:
+        _dir_cache.pop(next(iter(_dir_cache)), None)
+    _dir_cache[key] = (now, names, truncated)
+    return list(names), truncated
+
+
+def clear_dir_cache():
+    """清除目录列表缓存，处理流程写入文件后调用"""
+    _dir_cache.clear()
+
+
+# 上传文件名中允许保留的字符：字母数字、下划线、连字符、点和中文
+_SAFE_NAME_RE = re.compile(r'[^\w\-_\.\u4e00-\u9fff]')
+_ASCII_NAME_TABLE = str.maketrans({
+    c: '_' for c in map(chr, range(128)) if not (c.isalnum() or c in '-_.')
+})
+
+
+def save_upload(file_storage, path):
+    """
+    保存上传文件，替代 FileStorage.save 默认的16KB分块复制
+    上传已落盘为临时文件时用 os.sendfile 在内核中拷贝，否则使用1MB缓冲区复制
+    """
+    src = file_storage.stream
+    start = src.tell()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    with os.fdopen(fd, 'wb') as dst:
+        try:
+            src_fd = src.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            src_fd = None
+        if src_fd is not None and hasattr(os, "sendfile"):
+            offset = start
+            size = os.fstat(src_fd).st_size
+            try:
+                while offset < size:
+                    sent = os.sendfile(fd, src_fd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                return
+            except OSError:
+                # 文件系统不支持文件间 sendfile 时回退到用户态复制，已发送的部分作废，从头重新复制
+                src.seek(start)
+                dst.seek(0)
+                dst.truncate()
+        shutil.copyfileobj(src, dst, length=UPLOAD_COPY_BUFSIZE)
+
+
+def sanitize_filename(filename):
+    """替换文件名中的不安全字符，纯 ASCII 文件名走 str.translate 快速路径"""
+    if filename.isascii():
+        return filename.translate(_ASCII_NAME_TABLE)
+    return _SAFE_NAME_RE.sub('_', filename)
+
+
 def default_paths() -> Dict[str, str]:
     # 始终使用临时目录，适配云端部署
     return {
-        "excel_dir": "/tmp/uploads",
-        "csv_dir": "/tmp/converted",
-        "output_dir": "/tmp/output",
+        "excel_dir": str(UPLOAD_DIR),
+        "csv_dir": str(CONVERTED_DIR),
+        "output_dir": str(OUTPUT_DIR),
     }
 
 
+@lru_cache(maxsize=8)
+def render_index_page(script_root):
+    """默认首页只依赖固定路径和挂载前缀，渲染一次后复用"""
+    return render_template("index.html", app_name=APP_NAME, paths=default_paths(), result=None)
+
+
 @app.route("/", methods=["GET"])
 def index():
-    paths = default_paths()
-    return render_template("index.html", app_name=APP_NAME, paths=paths, result=None)
+    if "_flashes" in session:
+        # 有待显示的闪现消息时必须重新渲染
+        html = render_template("index.html", app_name=APP_NAME, paths=default_paths(), result=None)
+    else:
+        html = render_index_page(request.script_root)
+    response = make_response(html)
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.post("/admin/reload")
+def admin_reload():
+    """开发模式下清除预处理模块缓存，使修改后的处理逻辑立即生效"""
+    if not app.debug:
+        return jsonify({"ok": False, "message": "仅在调试模式下可用"}), 403
+
+    load_preprocessor_module.cache_clear()
+    render_index_page.cache_clear()
+    return jsonify({"ok": True, "message": "预处理模块及首页缓存已清除"})
+
+
+# 调试端点只返回这些环境变量，避免序列化整个 os.environ 并泄露密钥
+DEBUG_ENV_KEYS = ("PORT", "HOST", "DEBUG", "VERCEL_ENV", "VERCEL_REGION")
+# 调试端点不回显的请求头
+DEBUG_HIDDEN_HEADERS = frozenset({"authorization", "cookie", "proxy-authorization"})
 
 
 @app.route("/api/debug", methods=["GET", "POST"])
 def debug_info():
-    """调试信息端点"""
-    import sys
-    import platform
-
+    """调试信息端点，非 DEBUG 模式下只返回基本状态"""
     debug_data = {
         "method": request.method,
-        "python_version": sys.version,
-        "platform": platform.platform(),
         "flask_version": "Flask imported successfully",
-        "environment": dict(os.environ),
-        "request_headers": dict(request.headers),
-        "cwd": os.getcwd(),
         "tmp_exists": os.path.exists("/tmp"),
         "tmp_writable": os.access("/tmp", os.W_OK) if os.path.exists("/tmp") else False
     }
+    if os.environ.get("DEBUG", "").lower() != "true":
+        return jsonify(debug_data)
+
+    debug_data.update({
+        "python_version": sys.version,
+        "platform": platform.platform(),
+        "environment": {key: os.environ[key] for key in DEBUG_ENV_KEYS if key in os.environ},
+        "request_headers": {
+            key: value for key, value in request.headers.items()
+            if key.lower() not in DEBUG_HIDDEN_HEADERS
+        },
+        "cwd": os.getcwd(),
+    })
 
     if request.method == "POST":
-        debug_data["form_data"] = dict(request.form)
-        debug_data["files"] = list(request.files.keys())
+        debug_data["form_data"] = request.form.to_dict()
+        # 只在 multipart 请求时访问 request.files；文件内容由 DiscardFileStream 丢弃
+        if request.mimetype == "multipart/form-data":
+            debug_data["files"] = list(request.files)
 
     return jsonify(debug_data)
 
@@ -1047,19 +1795,21 @@ def scan():
         "output_dir": request.form.get("output_dir", "").strip(),
     }
 
-    result: Dict[str, Any] = {"ok": True, "excel": [], "csv": [], "messages": []}
+    result: Dict[str, Any] = {"ok": True, "excel": [], "csv": [], "truncated": False, "messages": []}
 
     try:
         excel_dir = Path(paths["excel_dir"]) if paths["excel_dir"] else None
         csv_dir = Path(paths["csv_dir"]) if paths["csv_dir"] else None
 
         if excel_dir and excel_dir.exists():
-            result["excel"] = [p.name for p in sorted(excel_dir.glob("*.xlsx"))]
+            result["excel"], truncated = list_dir(excel_dir, ".xlsx")
+            result["truncated"] |= truncated
         else:
             result["messages"].append("未找到有效的 Excel 源目录")
 
         if csv_dir and csv_dir.exists():
-            result["csv"] = [p.name for p in sorted(csv_dir.glob("*.csv"))]
+            result["csv"], truncated = list_dir(csv_dir, ".csv")
+            result["truncated"] |= truncated
         else:
             result["messages"].append("未找到有效的 CSV 目录")
 
@@ -1067,8 +1817,7 @@ def scan():
         result["ok"] = False
         result["messages"].append(f"扫描失败: {exc}")
 
-    flash("扫描完成", "info")
-    return render_template("index.html", app_name=APP_NAME, paths=paths, result=result)
+    return jsonify({"paths": paths, "result": result})
 
 
 @app.post("/process")
@@ -1092,21 +1841,20 @@ def process():
         csv_dir = Path(paths["csv_dir"]).expanduser()
         output_dir = Path(paths["output_dir"]).expanduser()
 
-        # 1) Excel → CSV
-        logger.info("步骤1: 开始Excel转CSV")
-        converted = module.convert_excel_to_csv(excel_dir, csv_dir)
-        result["messages"].append(f"Excel 转 CSV：{len(converted)} 个文件")
+        # 1-2) Excel → CSV 与预处理（按年度输出）流水线并行
+        logger.info("步骤1-2: 开始Excel转CSV与数据预处理")
+        converted_skipped = []
+        converted, summary = run_pipeline(module, excel_dir, csv_dir, output_dir, skipped=converted_skipped)
+        result["messages"].append(
+            f"Excel 转 CSV：{len(converted)} 个文件（未变化跳过 {len(converted_skipped)} 个）"
+        )
         logger.info(f"Excel转CSV完成，转换了 {len(converted)} 个文件")
 
-        # 2) 预处理（按年度输出 + 元数据）
-        logger.info("步骤2: 开始数据预处理")
-        restructurer = module.CarInsuranceDataRestructurer()
-        summary = restructurer.process_all_files(str(csv_dir), str(output_dir))
-
         # 3) 更新元数据
         logger.info("步骤3: 更新元数据")
         data_manager = module.DataStructureManager(str(output_dir))
         data_manager.update_metadata()
+        clear_dir_cache()
 
         elapsed = time.time() - start
         result["ok"] = True
@@ -1122,10 +1870,8 @@ def process():
         flash("处理完成", "success")
 
     except Exception as exc:
-        error_handler.log_error("数据处理流程", exc, {
-            "paths": paths,
-            "traceback": traceback.format_exc()
-        })
+        # 调用栈由 log_error 记录在 traceback 字段，上下文中不再重复保存
+        error_handler.log_error("数据处理流程", exc, {"paths": paths})
         result["ok"] = False
         result["messages"].append(f"处理失败: {exc}")
         flash("处理失败", "error")
@@ -1151,26 +1897,21 @@ def upload_files():
             return jsonify({"ok": False, "message": "未选择文件"}), 400
 
         files = request.files.getlist('files')
-        if not files or all(f.filename == '' for f in files):
+        if not files or not any(f.filename for f in files):
             return jsonify({"ok": False, "message": "未选择有效文件"}), 400
 
-        # 创建临时目录
-        upload_dir = Path("/tmp/uploads")
-        csv_dir = Path("/tmp/converted")
-        output_dir = Path("/tmp/output")
-
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        csv_dir.mkdir(parents=True, exist_ok=True)
-        output_dir.mkdir(parents=True, exist_ok=True)
+        # 临时目录已在启动时创建
+        upload_dir = UPLOAD_DIR
+        csv_dir = CONVERTED_DIR
+        output_dir = OUTPUT_DIR
 
         # 保存上传的文件
         uploaded_files = []
         for file in files:
             if file and file.filename and file.filename.endswith(('.xlsx', '.csv')):
-                import re
-                safe_filename = re.sub(r'[^\w\-_\.\u4e00-\u9fff]', '_', file.filename)
+                safe_filename = sanitize_filename(file.filename)
                 file_path = upload_dir / safe_filename
-                file.save(str(file_path))
+                save_upload(file, file_path)
                 uploaded_files.append(safe_filename)
 
         if not uploaded_files:
@@ -1179,16 +1920,15 @@ def upload_files():
         # 加载处理模块
         module = load_preprocessor_module()
 
-        # 1. Excel转CSV
-        converted_files = module.convert_excel_to_csv(str(upload_dir), str(csv_dir))
-
-        # 2. 数据预处理
-        restructurer = module.CarInsuranceDataRestructurer()
-        processing_result = restructurer.process_all_files(str(csv_dir), str(output_dir))
+        # 1-2. Excel转CSV与数据预处理流水线并行
+        converted_skipped = []
+        converted_files, processing_result = run_pipeline(module, upload_dir, csv_dir, output_dir,
+                                                          skipped=converted_skipped)
 
         # 3. 更新元数据
         data_manager = module.DataStructureManager(str(output_dir))
         data_manager.update_metadata()
+        clear_dir_cache()
 
         elapsed_time = time.time() - start_time
 
@@ -1197,6 +1937,7 @@ def upload_files():
             "message": f"成功处理 {len(uploaded_files)} 个文件",
             "uploaded_files": uploaded_files,
             "converted_files": converted_files,
+            "converted_skipped": converted_skipped,
             "processing_summary": processing_result.get("processing_summary", {}),
             "output_dir": str(output_dir),
             "elapsed_seconds": round(elapsed_time, 2),
@@ -1204,7 +1945,6 @@ def upload_files():
         })
 
     except Exception as exc:
-        import traceback
         error_msg = f"处理失败: {str(exc)}"
         print(f"[ERROR] {error_msg}")
         print(f"[ERROR] 堆栈: {traceback.format_exc()}")
@@ -1223,7 +1963,7 @@ def api_upload():
             return jsonify({"ok": False, "message": "未选择文件"}), 400
 
         files = request.files.getlist('files')
-        if not files or all(f.filename == '' for f in files):
+        if not files or not any(f.filename for f in files):
             return jsonify({"ok": False, "message": "未选择有效文件"}), 400
 
         return jsonify({
@@ -1241,33 +1981,176 @@ def api_upload():
         }), 500
 
 
+class ZipStreamBuffer(io.RawIOBase):
+    """
+    只写缓冲区：zipfile 写入的字节攒满一块后放入有界队列，由生成器取出发送给客户端
+    队列满时写入方阻塞，内存占用不随文件大小增长；取消后写入抛出 OSError 以结束压缩线程
+    """
+
+    def __init__(self, chunk_size=ZIP_STREAM_CHUNK_SIZE, max_chunks=ZIP_STREAM_QUEUE_CHUNKS):
+        super().__init__()
+        self._chunk_size = chunk_size
+        self._pending = bytearray()
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._cancelled = threading.Event()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self._cancelled.is_set():
+            raise OSError("下载已取消")
+        self._pending += b
+        if len(self._pending) >= self._chunk_size:
+            self._put(bytes(self._pending))
+            self._pending.clear()
+        return len(b)
+
+    def _put(self, item):
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._cancelled.is_set():
+                    raise OSError("下载已取消")
+
+    def finish(self, error=None):
+        """写入方结束：发送剩余字节，再放入结束标记（出错时为异常对象）"""
+        try:
+            if error is None and self._pending:
+                self._put(bytes(self._pending))
+            self._put(error)
+        except OSError:
+            pass
+
+    def chunks(self):
+        """读取方：依次产出字节块，写入方出错时在此重新抛出"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+def walk_files(root_dir):
+    """递归产出目录下所有文件路径，复用 DirEntry 缓存的类型信息，避免逐个 stat"""
+    stack = [str(root_dir)]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path
+
+
+def output_fingerprint(root_dir):
+    """根据文件相对路径、大小和修改时间计算目录内容指纹，作为 zip 缓存键"""
+    base = str(root_dir)
+    digest = hashlib.sha1()
+    for path in walk_files(base):
+        st = os.stat(path)
+        digest.update(f"{os.path.relpath(path, base)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _write_zip(root_dir, buffer):
+    """压缩线程：按目录顺序把文件写入 zip，已压缩格式直接存储"""
+    base = str(root_dir)
+    try:
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+            for path in walk_files(base):
+                # 已压缩格式直接存储，重复 DEFLATE 只耗 CPU 几乎不减小体积
+                if os.path.splitext(path)[1].lower() in ZIP_STORED_SUFFIXES:
+                    compress_type = zipfile.ZIP_STORED
+                else:
+                    compress_type = zipfile.ZIP_DEFLATED
+                zf.write(path, arcname=os.path.relpath(path, base), compress_type=compress_type)
+    except BaseException as exc:
+        buffer.finish(exc)
+    else:
+        buffer.finish()
+
+
+def iter_zip_stream(root_dir, cache_path=None):
+    """
+    在后台线程中压缩目录内容，边压缩边产出 zip 字节块，大文件也无需整文件压缩完才发送
+    指定 cache_path 时同时写入缓存文件，完整发送后原子替换，供后续下载直接 sendfile
+    """
+    buffer = ZipStreamBuffer()
+    cache_file = tmp_name = None
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=cache_path.parent, suffix=".part")
+        cache_file = os.fdopen(fd, "wb")
+
+    writer = threading.Thread(target=_write_zip, args=(root_dir, buffer), daemon=True)
+    writer.start()
+    completed = False
+    try:
+        for data in buffer.chunks():
+            if cache_file is not None:
+                cache_file.write(data)
+            yield data
+        completed = True
+    finally:
+        # 客户端断开或出错时通知压缩线程停止
+        buffer.cancel()
+        writer.join()
+        if cache_file is not None:
+            cache_file.close()
+            if completed:
+                os.chmod(tmp_name, 0o644)
+                os.replace(tmp_name, cache_path)
+                # 只保留最新输出对应的缓存
+                for stale in cache_path.parent.glob("*.zip"):
+                    if stale != cache_path:
+                        stale.unlink(missing_ok=True)
+            else:
+                os.unlink(tmp_name)
+
+
 @app.route("/download", methods=["GET", "POST"])
 def download_zip():
     """下载处理结果"""
     try:
         # 默认使用输出目录
-        output_dir = Path("/tmp/output")
+        output_dir = OUTPUT_DIR
 
-        if not output_dir.exists() or not any(output_dir.iterdir()):
+        # 一次 scandir 同时判断目录是否存在和是否为空
+        try:
+            with os.scandir(output_dir) as entries:
+                first_entry = next(entries, None)
+        except (FileNotFoundError, NotADirectoryError):
+            first_entry = None
+        if first_entry is None:
             return jsonify({"ok": False, "message": "没有可下载的文件"}), 404
 
-        # 将目录打包为内存 zip 并返回
-        memfile = io.BytesIO()
-        with zipfile.ZipFile(memfile, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for p in output_dir.rglob("*"):
-                if p.is_file():
-                    arcname = p.relative_to(output_dir)
-                    zf.write(p, arcname=str(arcname))
-        memfile.seek(0)
-
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"data_forge_processed_{timestamp}.zip"
 
-        return send_file(
-            memfile,
-            as_attachment=True,
-            download_name=filename,
+        # 输出未变化时直接发送缓存的 zip，由 wsgi.file_wrapper/sendfile 或 Nginx 零拷贝发送
+        fingerprint = output_fingerprint(output_dir)
+        cache_path = ZIP_CACHE_DIR / f"{fingerprint}.zip"
+        if cache_path.exists():
+            response = send_file(cache_path, mimetype="application/zip", as_attachment=True,
+                                 download_name=filename, conditional=True, etag=fingerprint)
+            if ZIP_ACCEL_REDIRECT_PREFIX:
+                response.headers["X-Accel-Redirect"] = f"{ZIP_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{cache_path.name}"
+            return response
+
+        # 边压缩边发送，内存占用不随输出目录大小增长
+        return Response(
+            iter_zip_stream(output_dir, cache_path),
             mimetype="application/zip",
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
         )
     except Exception as exc:
         return jsonify({"ok": False, "message": f"下载失败: {str(exc)}"}), 500
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+Gunicorn 配置：多进程 + 线程池
+上传和处理是长耗时的阻塞请求，多个 worker 保证单个请求不会阻塞整个服务
+"""
+
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}"
+worker_class = "gthread"
+workers = max(2, os.cpu_count() or 1)
+threads = 4
+timeout = 300
@@ -0,0 +1,87 @@
+import io
+
+import pandas as pd
+
+import app
+
+
+def test_english_source_headers_are_read(tmp_path, monkeypatch):
+    """已是英文名的源列（如 signed_premium_wan）读取 Excel 时不能被 usecols 丢弃"""
+    monkeypatch.setattr(app, "OUTPUT_FOLDER", str(tmp_path))
+    excel_path = tmp_path / "source.xlsx"
+    pd.DataFrame({
+        "保险起期": ["2024-03-01"],
+        "signed_premium_wan": [1.0],
+        "average_premium": [5000.0],
+        "满期净保费(万)": [0.8],
+    }).to_excel(excel_path, index=False)
+
+    result = app.DataProcessor().process_excel_to_csv(str(excel_path), original_filename="车险第40周.xlsx")
+
+    assert result["success"], result
+    output = pd.read_csv(result["output_files"][0]["path"], encoding="utf-8-sig")
+    assert output.loc[0, "signed_premium_yuan"] == 10000.0
+    assert output.loc[0, "policy_count"] == 2
+
+
+def test_read_excel_falls_back_to_default_engine(monkeypatch):
+    """calamine 引擎不可用（如 pandas < 2.2 或未安装）时回退默认引擎，上传流从原位置重新读取"""
+    buffer = io.BytesIO()
+    pd.DataFrame({"保险起期": [2024], "跟单保费(万)": [1.0]}).to_excel(buffer, index=False)
+    buffer.seek(0)
+
+    def unknown_engine(path, engine=None, **kwargs):
+        if engine == "calamine":
+            path.read()
+            raise ValueError("Unknown engine: calamine")
+        return real_read_excel(path, engine=engine, **kwargs)
+
+    real_read_excel = pd.read_excel
+    monkeypatch.setattr(app, "EXCEL_ENGINE", "calamine")
+    monkeypatch.setattr(app.pd, "read_excel", unknown_engine)
+
+    df = app.DataProcessor().read_excel(buffer)
+    assert df.columns.tolist() == ["保险起期", "跟单保费(万)"]
+
+
+def test_upload_reads_stream_from_start(tmp_path, monkeypatch):
+    """上传流已被读过时也从开头读取整个 Excel"""
+    monkeypatch.setattr(app, "OUTPUT_FOLDER", str(tmp_path))
+    buffer = io.BytesIO()
+    pd.DataFrame({"保险起期": [2024, 2025], "跟单保费(万)": [1.0, 2.0]}).to_excel(buffer, index=False)
+    buffer.seek(0)
+
+    with app.app.test_request_context(
+            "/upload", method="POST", data={"file": (buffer, "week40.xlsx")},
+            content_type="multipart/form-data"):
+        app.request.files["file"].stream.read()
+        result = app.upload_file().get_json()
+
+    assert result["success"], result
+    assert result["years_processed"] == [2024, 2025]
+
+
+def test_chunked_processing_matches_single_pass(tmp_path, monkeypatch):
+    """分块转换并按年度追加写出的 CSV 与整表一次转换的结果逐字节一致"""
+    excel_path = tmp_path / "source.xlsx"
+    rows = 7
+    pd.DataFrame({
+        "保险起期": [2023 + i % 3 for i in range(rows)],
+        "三级机构": ["天府", "高新", None, "天府", "新都", "高新", "天府"],
+        "是否新能源车1": ["是", "否", "是", None, "否", "是", "否"],
+        "跟单保费(万)": [1.5 + i for i in range(rows)],
+        "满期净保费(万)": [1.2] * rows,
+        "单均保费": [3000.0 + 100 * i for i in range(rows)],
+    }).to_excel(excel_path, index=False)
+
+    outputs = []
+    for chunk_rows in (2, 1_000):
+        output_dir = tmp_path / f"out{chunk_rows}"
+        output_dir.mkdir()
+        monkeypatch.setattr(app, "OUTPUT_FOLDER", str(output_dir))
+        monkeypatch.setattr(app, "PROCESS_CHUNK_ROWS", chunk_rows)
+        result = app.DataProcessor().process_excel_to_csv(str(excel_path), original_filename="车险第40周.xlsx")
+        assert result["success"], result
+        assert result["years_processed"] == [2023, 2024, 2025]
+        outputs.append({f["filename"]: open(f["path"], "rb").read() for f in result["output_files"]})
+    assert outputs[0] == outputs[1]
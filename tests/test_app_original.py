@@ -0,0 +1,192 @@
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+from werkzeug.datastructures import FileStorage
+
+import app_original
+
+
+def test_save_upload_restarts_copy_after_partial_sendfile(tmp_path, monkeypatch):
+    """sendfile 中途失败时回退复制必须从头开始，不能只写出剩余部分"""
+    payload = os.urandom(3 * 1024 * 1024)
+    src = tempfile.TemporaryFile("rb+")
+    src.write(payload)
+    src.seek(0)
+
+    real_sendfile = os.sendfile
+    calls = []
+
+    def flaky_sendfile(out_fd, in_fd, offset, count):
+        calls.append(offset)
+        if len(calls) > 1:
+            raise OSError("sendfile not supported")
+        return real_sendfile(out_fd, in_fd, offset, min(count, 1024 * 1024))
+
+    monkeypatch.setattr(os, "sendfile", flaky_sendfile)
+    target = tmp_path / "upload.xlsx"
+    app_original.save_upload(FileStorage(stream=src, filename="upload.xlsx"), target)
+
+    assert len(calls) == 2
+    assert target.read_bytes() == payload
+
+
+def test_standardize_boolean_series_handles_mixed_object_column():
+    """object 列中的真实布尔值、空值和带空白的字符串都按逐值规则转换"""
+    module = app_original.load_preprocessor_module()
+    read = pd.read_csv(io.StringIO("flag,n\nTrue,1\n,2\nFalse,3\n"))["flag"]
+    assert read.dtype == object
+    mixed = pd.Series([True, None, False, " 是 ", "N", 1, "x"], dtype=object)
+
+    for series in (read, mixed):
+        expected = [module.standardize_boolean_value(value) for value in series]
+        assert module.standardize_boolean_series(series).tolist() == expected
+    assert module.standardize_boolean_series(mixed).tolist() == [True, False, False, True, False, True, False]
+
+
+def test_iter_zip_stream_round_trip_and_cancel(tmp_path):
+    """流式打包的内容可完整解压，已压缩格式直接存储；中途关闭生成器不留下缓存文件"""
+    (tmp_path / "data").mkdir()
+    payload = os.urandom(256 * 1024) * 4
+    (tmp_path / "data" / "big.csv").write_bytes(payload)
+    (tmp_path / "data" / "x.parquet").write_bytes(b"parquet")
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(app_original.iter_zip_stream(tmp_path / "data"))))
+    assert archive.read("big.csv") == payload
+    assert archive.getinfo("big.csv").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo("x.parquet").compress_type == zipfile.ZIP_STORED
+
+    cache_path = tmp_path / "cache" / "out.zip"
+    stream = app_original.iter_zip_stream(tmp_path / "data", cache_path)
+    next(stream)
+    stream.close()
+    assert list(cache_path.parent.iterdir()) == []
+
+
+def test_restructured_output_does_not_depend_on_pyarrow(tmp_path, monkeypatch):
+    """源CSV的日期、数字样式文本列按同一解析器读取，是否安装 pyarrow 输出都逐字节一致"""
+    source = tmp_path / "2024年第05周.csv"
+    source.write_text(
+        "刷新时间,保险起期,三级机构,客户类别3,是否新能源车1,签单保费(万),满期净保费(万),单均保费,周次\n"
+        "2024-02-01 08:00:00,2024,010,00123,是,1.5,1.2,3000,5\n"
+        "2024-02-01 08:00:00,2024,020,00456,否,2.0,1.8,4000,5\n",
+        encoding="utf-8-sig",
+    )
+    module = app_original.load_preprocessor_module()
+    outputs = []
+    for pyarrow_module in (None, object()):
+        monkeypatch.setattr(app_original, "pyarrow", pyarrow_module)
+        output_dir = tmp_path / f"out{len(outputs)}"
+        output_dir.mkdir()
+        outcome = module.CarInsuranceDataRestructurer().process_csv_file(source, output_dir)
+        assert outcome["status"] == "ok", outcome
+        outputs.append((output_dir / outcome["file_info"]["output_file"]).read_bytes())
+    assert outputs[0] == outputs[1]
+
+
+def _write_week_excel(path, rows):
+    pd.DataFrame({
+        "刷新时间": ["2025-01-01"] * rows,
+        "保险起期": [2024 + i % 2 for i in range(rows)],
+        "三级机构": ["天府"] * rows,
+        "是否新能源车1": ["是" if i % 3 else "否" for i in range(rows)],
+        "跟单保费(万)": [1.5] * rows,
+        "满期净保费(万)": [1.2] * rows,
+        "单均保费": [3000] * rows,
+    }).to_excel(path, index=False)
+
+
+def test_run_pipeline_matches_sequential_processing(tmp_path):
+    """流水线的转换结果、预处理汇总和输出CSV与先转换再预处理的串行流程一致"""
+    module = app_original.load_preprocessor_module()
+    results = []
+    for mode in ("pipeline", "sequential"):
+        excel_dir, csv_dir, output_dir = (tmp_path / mode / name for name in ("excel", "csv", "output"))
+        excel_dir.mkdir(parents=True)
+        csv_dir.mkdir()
+        for week in (38, 39, 40):
+            _write_week_excel(excel_dir / f"2024年第{week}周.xlsx", 20)
+        (excel_dir / "broken.xlsx").write_bytes(b"not a zip")
+        (csv_dir / "empty.csv").write_text("a,b\n", encoding="utf-8")
+
+        skipped = []
+        if mode == "pipeline":
+            converted, summary = app_original.run_pipeline(module, excel_dir, csv_dir, output_dir, skipped=skipped)
+        else:
+            converted = module.convert_excel_to_csv(excel_dir, csv_dir, skipped=skipped)
+            summary = module.CarInsuranceDataRestructurer().process_all_files(str(csv_dir), str(output_dir))
+        with open(output_dir / "data_restructure_report.json", encoding="utf-8") as f:
+            report = json.load(f)
+        outputs = {p.name: p.read_bytes() for p in output_dir.glob("*.csv")}
+        results.append((converted, skipped, summary, report["processed_files"], report["failed_files"], outputs))
+
+    assert results[0][5]
+    assert results[0] == results[1]
+
+
+def test_download_zip_cache_follows_output_changes(tmp_path, monkeypatch):
+    """输出未变化时下载直接发送缓存的 zip；文件修改后指纹变化，重新打包并清理旧缓存"""
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    data_file = output_dir / "2024保单第05周变动成本明细表.csv"
+    data_file.write_text("a\n1\n", encoding="utf-8")
+    cache_dir = tmp_path / "zip_cache"
+    monkeypatch.setattr(app_original, "OUTPUT_DIR", output_dir)
+    monkeypatch.setattr(app_original, "ZIP_CACHE_DIR", cache_dir)
+    client = app_original.app.test_client()
+
+    def download():
+        # 读完响应体后关闭，与 WSGI 服务器一样触发生成器收尾写入缓存
+        response = client.get("/download")
+        response.get_data()
+        response.close()
+        return response
+
+    first = download()
+    assert first.status_code == 200 and "ETag" not in first.headers
+    fingerprint = app_original.output_fingerprint(output_dir)
+    assert [p.name for p in cache_dir.iterdir()] == [f"{fingerprint}.zip"]
+
+    cached = download()
+    assert cached.headers["ETag"] == f'"{fingerprint}"'
+    assert cached.data == first.data
+
+    data_file.write_text("a\n2\n", encoding="utf-8")
+    os.utime(data_file, ns=(data_file.stat().st_atime_ns, data_file.stat().st_mtime_ns + 1_000_000))
+    new_fingerprint = app_original.output_fingerprint(output_dir)
+    assert new_fingerprint != fingerprint
+
+    rebuilt = download()
+    assert "ETag" not in rebuilt.headers
+    assert zipfile.ZipFile(io.BytesIO(rebuilt.data)).read(data_file.name) == b"a\n2\n"
+    assert [p.name for p in cache_dir.iterdir()] == [f"{new_fingerprint}.zip"]
+
+
+def test_file_index_cache_invalidated_by_directory_changes(tmp_path, monkeypatch):
+    """输出目录 mtime 未变化时复用文件索引；原子替换写入新文件后目录 mtime 变化，重新扫描"""
+    module = app_original.load_preprocessor_module()
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    (output_dir / "2024保单第05周变动成本明细表.csv").write_text("a\n1\n", encoding="utf-8")
+    manager = module.DataStructureManager(output_dir)
+
+    # 刚修改过的目录处于 mtime 粒度窗口内，不缓存
+    first = manager._build_file_index()
+    assert module.DataStructureManager(output_dir)._build_file_index() is not first
+
+    old_ns = time.time_ns() - 10_000_000_000
+    os.utime(output_dir, ns=(old_ns, old_ns))
+    indexed = manager._build_file_index()
+    assert module.DataStructureManager(output_dir)._build_file_index() is indexed
+    assert sorted(indexed["years_data"]) == [2024]
+
+    part = output_dir / "2025保单第06周变动成本明细表.csv.part"
+    part.write_text("a\n1\n", encoding="utf-8")
+    os.replace(part, output_dir / "2025保单第06周变动成本明细表.csv")
+    refreshed = module.DataStructureManager(output_dir)._build_file_index()
+    assert refreshed is not indexed
+    assert sorted(refreshed["years_data"]) == [2024, 2025]
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+WSGI 入口
+启动方式: gunicorn -c gunicorn_conf.py wsgi:app
+"""
+
+from app import app
+
+__all__ = ['app']